@@ -0,0 +1,368 @@
+"""
+Offline benchmark for the Rulerr listeners.
+
+Replays synthetic event streams through `on_message` and the reaction listeners, with in-memory
+stand-ins for Config, the bot, guild, channels and messages. Nothing talks to Discord. Role grants and DMs
+run in background workers, they are drained after the reactions and reported on their own.
+
+Run from the repository root:
+
+    python -m benchmarks.rulerr_listeners --events 20000
+"""
+# Bot Packages
+import discord
+
+import argparse
+import asyncio
+import copy
+import random
+import time
+from types import SimpleNamespace
+from unittest import mock
+
+from rulerr import agreement as agreement_module
+from rulerr import rulerr as rulerr_module
+
+GUILD_ID = 1000
+RULES_CHANNEL_ID = 2000
+CHAT_CHANNEL_ID = 2001
+AGREEMENT_MSG_ID = 3000
+REACT_MSG_ID = 3001
+ROLE_ID = 4000
+BOT_ID = 1
+
+WORDS = ["hello", "anyone", "docker", "compose", "nginx", "logs", "thanks", "works", "now", "why", "broken"]
+
+
+class Counters:
+    def __init__(self):
+        self.reads = 0
+        self.writes = 0
+        self.rest = 0
+
+
+class FakeValueCtx:
+    """Awaitable and async context manager, like the object returned by calling a Red Value"""
+
+    def __init__(self, group, path):
+        self.group = group
+        self.path = path
+        self.value = None
+
+    def __await__(self):
+        return self.group.get_raw(*self.path).__await__()
+
+    async def __aenter__(self):
+        self.value = await self.group.get_raw(*self.path)
+        return self.value
+
+    async def __aexit__(self, *exc):
+        await self.group.set_raw(*self.path, value=self.value)
+
+
+class FakeValue:
+    def __init__(self, group, path):
+        self.group = group
+        self.path = path
+
+    def __call__(self):
+        return FakeValueCtx(self.group, self.path)
+
+    def __getattr__(self, name):
+        return FakeValue(self.group, self.path + (name,))
+
+    async def set(self, value):
+        await self.group.set_raw(*self.path, value=value)
+
+    async def clear(self):
+        await self.group.clear_raw(*self.path)
+
+    async def get_raw(self, *path):
+        return await self.group.get_raw(*self.path, *path)
+
+    async def set_raw(self, *path, value):
+        await self.group.set_raw(*self.path, *path, value=value)
+
+    async def clear_raw(self, *path):
+        await self.group.clear_raw(*self.path, *path)
+
+
+class FakeGroup:
+    """The subset of a Red Config guild group used by Rulerr, backed by a dict"""
+
+    def __init__(self, data, counters):
+        self.data = data
+        self.counters = counters
+
+    def __getattr__(self, name):
+        return FakeValue(self, (name,))
+
+    def get_attr(self, name):
+        return FakeValue(self, (name,))
+
+    async def all(self):
+        self.counters.reads += 1
+        return copy.deepcopy(self.data)
+
+    async def get_raw(self, *path):
+        self.counters.reads += 1
+        value = self.data
+        for key in path:
+            value = value[key]
+        return copy.deepcopy(value)
+
+    async def set_raw(self, *path, value):
+        self.counters.writes += 1
+        target = self.data
+        for key in path[:-1]:
+            target = target.setdefault(key, {})
+        target[path[-1]] = copy.deepcopy(value)
+
+    async def clear_raw(self, *path):
+        self.counters.writes += 1
+        target = self.data
+        for key in path[:-1]:
+            target = target[key]
+        target.pop(path[-1], None)
+
+
+class FakeConfig:
+    def __init__(self, counters):
+        self.counters = counters
+        self.defaults = {}
+        self.guilds = {}
+
+    def register_guild(self, **defaults):
+        self.defaults = defaults
+
+    def guild_from_id(self, guild_id):
+        if guild_id not in self.guilds:
+            self.guilds[guild_id] = copy.deepcopy(self.defaults)
+        return FakeGroup(self.guilds[guild_id], self.counters)
+
+    def guild(self, guild):
+        return self.guild_from_id(guild.id)
+
+    async def all_guilds(self):
+        self.counters.reads += 1
+        return copy.deepcopy(self.guilds)
+
+
+class FakeMember:
+    def __init__(self, member_id, counters, bot=False):
+        self.id = member_id
+        self.bot = bot
+        self.roles = []
+        self.mention = f"<@{member_id}>"
+        self.counters = counters
+
+    async def add_roles(self, *roles, reason=None):
+        self.counters.rest += 1
+        self.roles.extend(roles)
+
+    async def send(self, *args, **kwargs):
+        self.counters.rest += 1
+
+
+class FakeMessage:
+    def __init__(self, message_id, channel, author=None, content=""):
+        self.id = message_id
+        self.channel = channel
+        self.guild = channel.guild
+        self.author = author
+        self.content = content
+        self.mentions = []
+        self.embeds = []
+
+    async def _rest(self, *args, **kwargs):
+        self.channel.counters.rest += 1
+
+    add_reaction = remove_reaction = clear_reaction = clear_reactions = edit = _rest
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild, counters):
+        self.id = channel_id
+        self.guild = guild
+        self.counters = counters
+
+    def get_partial_message(self, message_id):
+        return FakeMessage(message_id, self)
+
+    async def fetch_message(self, message_id):
+        self.counters.rest += 1
+        return FakeMessage(message_id, self)
+
+    async def send(self, *args, **kwargs):
+        self.counters.rest += 1
+
+    def permissions_for(self, member):
+        return discord.Permissions.all()
+
+
+class FakeGuild:
+    def __init__(self, counters):
+        self.id = GUILD_ID
+        self.name = "Benchmark"
+        self.role = SimpleNamespace(id=ROLE_ID, name="Agreed")
+        self.me = FakeMember(BOT_ID, counters, bot=True)
+
+    def get_role(self, role_id):
+        return self.role if role_id == ROLE_ID else None
+
+
+class FakeBot:
+    def __init__(self, channels):
+        avatar = SimpleNamespace(url="https://cdn.discordapp.com/embed/avatars/0.png")
+        self.user = SimpleNamespace(id=BOT_ID, name="Rulerr", display_avatar=SimpleNamespace(
+            replace=lambda **kwargs: avatar))
+        self.channels = channels
+        self.loop = asyncio.get_event_loop()
+
+    def get_channel(self, channel_id):
+        return self.channels.get(channel_id)
+
+    def get_user(self, user_id):
+        return None
+
+
+def ruleset(count):
+    lines = ["Welcome to the server, please follow these rules."]
+    for number in range(1, count + 1):
+        words = " ".join(random.choice(WORDS) for _ in range(8))
+        lines.append(f"§{number}: {words}")
+        if number % 5 == 0:
+            lines.append(f"§{number}b: also {words}")
+    return "\n".join(lines)
+
+
+async def build(rules_count):
+    counters = Counters()
+    config = FakeConfig(counters)
+    guild = FakeGuild(counters)
+    channels = {}
+    bot = FakeBot(channels)
+    for channel_id in (RULES_CHANNEL_ID, CHAT_CHANNEL_ID):
+        channels[channel_id] = FakeChannel(channel_id, guild, counters)
+
+    with mock.patch.object(rulerr_module.Config, "get_conf", lambda *args, **kwargs: config):
+        cog = rulerr_module.Rulerr(bot)
+
+    group = config.guild(guild)
+    await group.set_raw("rules", value={
+        "main": {"rule_text": ruleset(rules_count), "alternate": ruleset(rules_count // 2),
+                 "edited": "2023-05-08 16:52:00.000000"},
+    })
+    await group.set_raw("default_rule", value="main")
+    await group.set_raw("agreement_role", value=ROLE_ID)
+    link = f"https://discord.com/channels/{GUILD_ID}/{RULES_CHANNEL_ID}"
+    await group.set_raw("agreement_msg", value={"channel": RULES_CHANNEL_ID, "message": AGREEMENT_MSG_ID,
+                                                "link": f"{link}/{AGREEMENT_MSG_ID}"})
+    await group.set_raw("react_rules", value={str(REACT_MSG_ID): {
+        "name": "main", "channel": RULES_CHANNEL_ID, "message": REACT_MSG_ID, "link": f"{link}/{REACT_MSG_ID}"}})
+    await cog.initialize()
+    return cog, bot, guild, counters
+
+
+def chat_stream(bot, guild, counters, events, lookups):
+    channel = bot.get_channel(CHAT_CHANNEL_ID)
+    for index in range(events):
+        author = FakeMember(10_000 + index % 500, counters)
+        roll = random.random()
+        if roll < lookups:
+            content = "§" + " ".join(str(random.randint(1, 30)) for _ in range(random.randint(1, 3)))
+        elif roll < lookups * 1.2:
+            content = "§?" + random.choice(WORDS)
+        else:
+            content = " ".join(random.choice(WORDS) for _ in range(random.randint(2, 12)))
+        kind = "lookup" if content.startswith("§") else "chat"
+        yield kind, "on_message", FakeMessage(index, channel, author=author, content=content)
+
+
+def reaction_stream(guild, counters, events):
+    for index in range(events):
+        member = FakeMember(20_000 + index, counters)
+        agreement = index % 2 == 0
+        yield ("agreement" if agreement else "alternate"), "on_raw_reaction_add", SimpleNamespace(
+            guild_id=GUILD_ID, channel_id=RULES_CHANNEL_ID,
+            message_id=AGREEMENT_MSG_ID if agreement else REACT_MSG_ID,
+            emoji="\N{THUMBS UP SIGN}" if agreement else "\N{INCOMING ENVELOPE}",
+            event_type="REACTION_ADD", user_id=member.id, member=member)
+        # Reactions on messages the cog does not watch
+        yield "unwatched", "on_raw_reaction_add", SimpleNamespace(
+            guild_id=GUILD_ID, channel_id=CHAT_CHANNEL_ID, message_id=90_000 + index,
+            emoji="\N{THUMBS UP SIGN}", event_type="REACTION_ADD", user_id=member.id, member=member)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+async def replay(cog, counters, stream):
+    results = {}
+    started = time.perf_counter()
+    for kind, listener, event in stream:
+        result = results.setdefault(kind, {"latency": [], "reads": 0, "rest": 0})
+        reads, rest = counters.reads, counters.rest
+        before = time.perf_counter()
+        await getattr(cog, listener)(event)
+        result["latency"].append(time.perf_counter() - before)
+        result["reads"] += counters.reads - reads
+        result["rest"] += counters.rest - rest
+    return results, time.perf_counter() - started
+
+
+async def drain(cog, counters):
+    """Waits for the role grants and DMs the listeners queued, and counts what they cost"""
+    reads, rest = counters.reads, counters.rest
+    started = time.perf_counter()
+    while True:
+        tasks = [worker.task for worker in cog.agreement._guilds.values() if worker.task is not None]
+        tasks += cog.dm.workers
+        tasks = [task for task in tasks if not task.done()]
+        if not tasks:
+            break
+        await asyncio.gather(*tasks)
+    return counters.reads - reads, counters.rest - rest, time.perf_counter() - started
+
+
+def report(title, results, elapsed):
+    total = sum(len(result["latency"]) for result in results.values())
+    print(f"\n{title}: {total} events in {elapsed:.3f}s, {total / elapsed:,.0f} events/sec")
+    print(f"{'kind':<12}{'events':>8}{'reads/event':>13}{'rest/event':>12}{'p50 µs':>10}{'p99 µs':>10}")
+    for kind, result in sorted(results.items()):
+        latency = sorted(result["latency"])
+        count = len(latency)
+        print(f"{kind:<12}{count:>8}{result['reads'] / count:>13.3f}{result['rest'] / count:>12.3f}"
+              f"{percentile(latency, 0.5) * 1e6:>10.1f}{percentile(latency, 0.99) * 1e6:>10.1f}")
+
+
+async def main(args):
+    random.seed(args.seed)
+    cog, bot, guild, counters = await build(args.rules)
+
+    results, elapsed = await replay(cog, counters, chat_stream(bot, guild, counters, args.events, args.lookups))
+    report("Messages", results, elapsed)
+
+    # Role grants are spaced out by GRANT_INTERVAL in production, that wait is not what is measured here
+    with mock.patch.object(agreement_module, "GRANT_INTERVAL", 0):
+        results, elapsed = await replay(cog, counters, reaction_stream(guild, counters, args.reactions))
+        report("Reactions", results, elapsed)
+        reads, rest, drained = await drain(cog, counters)
+    queued = sum(len(results[kind]["latency"]) for kind in ("agreement", "alternate") if kind in results)
+    print(f"Queued work: {rest} rest calls ({rest / max(queued, 1):.3f} per agreement/alternate event), "
+          f"{reads} reads, drained in {drained:.3f}s")
+
+    await cog.cog_unload()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the Rulerr listeners with synthetic events")
+    parser.add_argument("--events", type=int, default=20000, help="Messages to replay")
+    parser.add_argument("--reactions", type=int, default=2000, help="Reactions to replay")
+    parser.add_argument("--lookups", type=float, default=0.05, help="Share of messages that are §N lookups")
+    parser.add_argument("--rules", type=int, default=40, help="Rules in the default ruleset")
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(main(parser.parse_args()))
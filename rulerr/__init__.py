@@ -8,4 +8,5 @@ __red_end_user_data_statement__ = (
 async def setup(bot):
     cog = Rulerr(bot)
     await cog.migrate()
+    await cog.initialize()
     await bot.add_cog(cog)
@@ -0,0 +1,107 @@
+# Bot Packages
+import discord
+from redbot.core.i18n import Translator
+
+import asyncio
+import time
+from collections import deque
+
+_ = Translator('Rulerr', __file__)
+
+# Seconds between role grants, discord.py still waits out any 429 on top of this
+GRANT_INTERVAL = 1
+# Above this many handled reactions, clearing the emoji and re-adding it is cheaper than removing one by one
+REACTION_BATCH = 3
+
+
+class AgreementWorker:
+    """Grants the agreement role for one guild, one member at a time"""
+
+    def __init__(self, log):
+        self.log = log
+        self.pending = {}
+        self.unreact = []
+        self.failed = []
+        self.latencies = deque(maxlen=500)
+        self.granted = 0
+        self.task = None
+        self.msg = None
+        self.role = None
+        self.emoji = None
+
+    def submit(self, member: discord.Member, msg: discord.Message, role: discord.Role, emoji: str):
+        """Queues the member, a member already in the queue is not added twice"""
+        self.msg, self.role, self.emoji = msg, role, emoji
+        if member.id not in self.pending:
+            self.pending[member.id] = (member, time.monotonic())
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run(), name=f"rulerr-agreement-{msg.guild.id}")
+
+    @property
+    def depth(self) -> int:
+        return len(self.pending)
+
+    async def _run(self):
+        while self.pending:
+            member_id = next(iter(self.pending))
+            member, queued = self.pending.pop(member_id)
+            self.unreact.append(member)
+            if self.role not in member.roles:
+                try:
+                    await member.add_roles(self.role, reason=_('Agreed to the rules'))
+                    self.granted += 1
+                    self.latencies.append(time.monotonic() - queued)
+                except discord.HTTPException:
+                    self.failed.append(member)
+                await asyncio.sleep(GRANT_INTERVAL)
+            if len(self.unreact) >= REACTION_BATCH or not self.pending:
+                await self._flush()
+
+    async def _flush(self):
+        msg, emoji = self.msg, self.emoji
+        members, self.unreact = self.unreact, []
+        failed, self.failed = self.failed, []
+        try:
+            if len(members) >= REACTION_BATCH:
+                await msg.clear_reaction(emoji)
+                await msg.add_reaction(emoji)
+            else:
+                for member in members:
+                    await msg.remove_reaction(emoji, member)
+        except discord.HTTPException:
+            failed.extend(member for member in members if member not in failed)
+
+        if not failed:
+            return
+        if msg.channel.permissions_for(msg.guild.me).send_messages:
+            await msg.channel.send("{} {}".format(
+                _('Tell a mod to fix my perms'), " ".join(member.mention for member in failed)))
+        else:
+            self.log.info("The bot is missing perms in %s to agree" % (msg.guild.name))
+
+    def stats(self) -> dict:
+        latencies = sorted(self.latencies)
+        return {
+            "depth": self.depth,
+            "granted": self.granted,
+            "latency_p50": latencies[len(latencies) // 2] if latencies else None,
+            "latency_max": latencies[-1] if latencies else None,
+        }
+
+
+class AgreementQueue:
+    """Keeps a AgreementWorker per guild"""
+
+    def __init__(self, log):
+        self.log = log
+        self._guilds = {}
+
+    def guild(self, guild) -> AgreementWorker:
+        if guild.id not in self._guilds:
+            self._guilds[guild.id] = AgreementWorker(self.log)
+        return self._guilds[guild.id]
+
+    def cancel(self):
+        for worker in self._guilds.values():
+            if worker.task is not None:
+                worker.task.cancel()
@@ -0,0 +1,144 @@
+from collections import OrderedDict
+
+from .index import RuleIndex, SearchIndex
+
+# Rendered embeds kept per guild, least recently used are evicted first
+EMBED_CACHE_SIZE = 32
+# Settings holding linked messages, keyed by message ID
+LINK_SETTINGS = ("auto_update", "react_rules")
+
+
+class GuildRuleCache:
+    """In-memory snapshot of the guild settings read by the listeners"""
+
+    def __init__(self, config):
+        self.config = config
+        self.loaded = False
+        self.prefix = "§"
+        self.default_rule = None
+        self.rules = {}
+        self.indexes = {}
+        self.search = SearchIndex()
+        self.emoji = "\N{THUMBS UP SIGN}"
+        self.alt_emoji = "\N{INCOMING ENVELOPE}"
+        self.agreement_role = ""
+        self.agreement_msg = None
+        self.react_rules = {}
+        self.watched = set()
+        # Linked message IDs by ruleset name, in stored order, so the links of a ruleset are found without a scan
+        self.link_names = {setting: {} for setting in LINK_SETTINGS}
+        self.embeds = OrderedDict()
+
+    async def load(self, data: dict = None):
+        """Reads the guild settings in one go, unless they are handed over"""
+        if data is None:
+            data = await self.config.all()
+        self.prefix = data.get("rule_prefix", "§")
+        self.default_rule = data.get("default_rule")
+        self.rules = {}
+        self.indexes = {}
+        self.search = SearchIndex()
+        self.embeds.clear()
+        for name, rule in data.get("rules", {}).items():
+            self.set_rule(name, rule)
+        self.emoji = data.get("emoji", "\N{THUMBS UP SIGN}")
+        self.alt_emoji = data.get("alt_emoji", "\N{INCOMING ENVELOPE}")
+        self.agreement_role = data.get("agreement_role", "")
+        self.agreement_msg = data.get("agreement_msg", {}).get("message")
+        self.react_rules = {int(message): link["name"] for message, link in data.get("react_rules", {}).items()}
+        # Message IDs the reaction listeners care about, checked before anything is fetched
+        self.watched = set(self.react_rules)
+        if self.agreement_msg is not None:
+            self.watched.add(self.agreement_msg)
+        self.link_names = {setting: {} for setting in LINK_SETTINGS}
+        for setting in LINK_SETTINGS:
+            for message, link in data.get(setting, {}).items():
+                self.link_names[setting].setdefault(link["name"], {})[message] = None
+        self.loaded = True
+        return self
+
+    async def get(self):
+        """Returns the snapshot, loading it first if it has been invalidated"""
+        if not self.loaded:
+            await self.load()
+        return self
+
+    def set_rule(self, name: str, rule: dict):
+        """Stores a ruleset, only indexing it again if the rule text changed"""
+        old = self.rules.get(name)
+        self.rules[name] = dict(rule)
+        if old is None or old.get("rule_text") != rule.get("rule_text") or name not in self.indexes:
+            self.indexes[name] = RuleIndex(rule.get("rule_text"))
+            self.search.add(name, self.indexes[name])
+        self._drop_embeds(name)
+
+    def remove_rule(self, name: str):
+        self.rules.pop(name, None)
+        self.indexes.pop(name, None)
+        self.search.remove(name)
+        self._drop_embeds(name)
+
+    def add_link(self, setting: str, message: str, name: str):
+        """Indexes a linked message, react rules are also watched by the listeners"""
+        self.link_names[setting].setdefault(name, {})[message] = None
+        if setting == "react_rules":
+            self.react_rules[int(message)] = name
+            self.watched.add(int(message))
+
+    def remove_link(self, setting: str, message: str, name: str):
+        messages = self.link_names[setting].get(name)
+        if messages is not None:
+            messages.pop(message, None)
+            if not messages:
+                del self.link_names[setting][name]
+        if setting == "react_rules":
+            self.react_rules.pop(int(message), None)
+            if int(message) != self.agreement_msg:
+                self.watched.discard(int(message))
+
+    def get_embed(self, key: tuple):
+        embed = self.embeds.get(key)
+        if embed is not None:
+            self.embeds.move_to_end(key)
+        return embed
+
+    def put_embed(self, key: tuple, embed):
+        self.embeds[key] = embed
+        self.embeds.move_to_end(key)
+        while len(self.embeds) > EMBED_CACHE_SIZE:
+            self.embeds.popitem(last=False)
+
+    def _drop_embeds(self, name: str):
+        for key in [key for key in self.embeds if key[0] == name]:
+            del self.embeds[key]
+
+    def invalidate(self):
+        self.loaded = False
+
+
+class RuleCache:
+    """Keeps a GuildRuleCache per guild, so the hot paths does not hit Config"""
+
+    def __init__(self, config):
+        self.config = config
+        self._guilds = {}
+
+    def guild(self, guild) -> GuildRuleCache:
+        return self.guild_from_id(guild.id)
+
+    def guild_from_id(self, guild_id: int) -> GuildRuleCache:
+        if guild_id not in self._guilds:
+            self._guilds[guild_id] = GuildRuleCache(self.config.guild_from_id(guild_id))
+        return self._guilds[guild_id]
+
+    async def initialize(self):
+        """Warms the cache for every guild with stored settings"""
+        for guild_id, data in (await self.config.all_guilds()).items():
+            await self.guild_from_id(guild_id).load(data)
+
+    def invalidate(self, guild_id: int = None):
+        if guild_id is None:
+            for cache in self._guilds.values():
+                cache.invalidate()
+        elif guild_id in self._guilds:
+            self._guilds[guild_id].invalidate()
@@ -0,0 +1,69 @@
+# Bot Packages
+import discord
+from redbot.core.i18n import Translator
+
+import asyncio
+import time
+
+_ = Translator('Rulerr', __file__)
+
+# Amount of DMs in flight at the same time
+DM_WORKERS = 3
+# Seconds before the same user gets the same ruleset again
+DM_COOLDOWN = 60
+
+
+class DMDelivery:
+    """Sends alternate rulesets to users from a bounded pool of workers"""
+
+    def __init__(self, helper, log):
+        self.helper = helper
+        self.log = log
+        self.queue = asyncio.Queue()
+        self.workers = []
+        self.recent = {}
+        self.failed = {}
+
+    def submit(self, user: discord.User, channel: discord.abc.Messageable, cache, name: str, text: str, date: str):
+        """Queues a DM, unless the user was sent the same ruleset within the cooldown"""
+        now = time.monotonic()
+        key = (user.id, channel.guild.id, name)
+        if now - self.recent.get(key, -DM_COOLDOWN) < DM_COOLDOWN:
+            return False
+        self.recent[key] = now
+        self.queue.put_nowait((user, channel, cache, name, text, date))
+        self.workers = [worker for worker in self.workers if not worker.done()]
+        if len(self.workers) < DM_WORKERS:
+            self.workers.append(asyncio.create_task(self._run(), name="rulerr-dm"))
+        return True
+
+    async def _run(self):
+        while not self.queue.empty():
+            user, channel, cache, name, text, date = self.queue.get_nowait()
+            try:
+                # The rendered embed is shared by everyone asking for this version of the ruleset
+                await user.send(embed=await self.helper._rule_embed(cache, name, text, date, kind="alternate"))
+            except discord.HTTPException:
+                self.failed.setdefault(channel, []).append(user)
+            finally:
+                self.queue.task_done()
+        if self.failed and all(worker.done() for worker in self.workers if worker is not asyncio.current_task()):
+            await self._report()
+        self._prune()
+
+    async def _report(self):
+        failed, self.failed = self.failed, {}
+        for channel, users in failed.items():
+            if channel.permissions_for(channel.guild.me).send_messages:
+                await channel.send("{} {}".format(
+                    _("I can't send you messages"), " ".join(user.mention for user in users)))
+            else:
+                self.log.info("Could not DM %s users in %s" % (len(users), channel.guild.name))
+
+    def _prune(self):
+        now = time.monotonic()
+        self.recent = {key: sent for key, sent in self.recent.items() if now - sent < DM_COOLDOWN}
+
+    def cancel(self):
+        for worker in self.workers:
+            worker.cancel()
@@ -3,55 +3,110 @@ import discord
 from redbot.core.i18n import Translator
 
 import asyncio
+import hashlib
 from datetime import datetime
 
 _ = Translator('Rulerr', __file__)
 
+# How many channels are updated at the same time, discord.py waits out the per-channel buckets
+UPDATE_CONCURRENCY = 5
+
 
 class RuleHelper:
     def __init__(self, bot):
         self.bot = bot
 
-    async def _update_messages(self, ctx, rules, name=None, nomsg=False):
-        auto_update_messages = await rules.get_settings("auto_update")
-        agreement_msg = await rules.get_settings("agreement_msg")
+    async def _update_messages(self, ctx, rules, name=None, nomsg=False, force=False):
+        async with rules.batch():
+            to_update = await rules.get_links("auto_update", name=name)
+            agreement_msg = await rules.get_settings("agreement_msg")
+            emoji = await rules.get_settings("emoji")
+            texts = {message["name"]: await rules.get_rule_text(message["name"]) for message in to_update}
+        content = _('Please react with {emoji} to agree to the rules').format(emoji=emoji)
+
+        # Message edits are rate limited per channel, so each channel gets its own queue
+        channels = {}
+        for message in to_update:
+            channels.setdefault(message["channel"], []).append(message)
 
+        progress = None
         if not nomsg:
-            await ctx.send(_('Updating messages'))
+            progress = await ctx.send(_('Updating messages'))
+
+        s_embed = await self._create_embed(text=_('Messages updated'))
+        hashes = {}
+        skipped = 0
+        done = 0
+        limit = asyncio.Semaphore(UPDATE_CONCURRENCY)
+
+        async def update_channel(messages):
+            nonlocal done, skipped
+            async with limit:
+                for message in messages:
+                    done += 1
+                    updated_text, date = texts[message["name"]]
+                    if updated_text is None:
+                        s_embed.add_field(name=_('Could not find the following ruleset'), value=message["name"])
+                        continue
+
+                    is_agreement = message.get("message") == agreement_msg.get("message")
+                    rendered = self._render_hash(updated_text, date, content if is_agreement else None)
+                    if not force and message.get("hash") == rendered:
+                        skipped += 1
+                        continue
 
-        async with ctx.channel.typing():
-            s_embed = await self._create_embed(text=_('Messages updated'))
-            for message in auto_update_messages:
-                if message["name"] == name or name is None:
                     msg = await self._get_linked_message(ctx, message["link"])
                     if msg is None:
                         s_embed.add_field(name=_('Could not find this message'), value=f'[link]({message["link"]})')
                         continue
 
-                    updated_text, date = await rules.get_rule_text(message["name"])
-                    if updated_text is None:
-                        s_embed.add_field(name=_('Could not find the following ruleset'), value=message["name"])
-                        continue
-
-                    await asyncio.sleep(2)
-                    embed = await self._create_embed(updated_text, date)
-                    content = None
-
+                    embed = await self._rule_embed(rules.cache, message["name"], updated_text, date)
                     if len(msg.embeds) == 1:
                         embed.colour = msg.embeds[0].colour
-                    if message.get("message") == agreement_msg.get("message"):
-                        content = _('Please react with {emoji} to agree to the rules').format(
-                            emoji=await rules.get_settings("emoji"))
-                    await msg.edit(content=content, embed=embed)
+                    try:
+                        await msg.edit(content=content if is_agreement else None, embed=embed)
+                        hashes[message["message"]] = rendered
+                    except discord.HTTPException:
+                        s_embed.add_field(name=_('Could not update this message'), value=f'[link]({message["link"]})')
+            if progress is not None and done < len(to_update):
+                await progress.edit(content="{} ({}/{})".format(_('Updating messages'), done, len(to_update)))
+
+        async with ctx.channel.typing():
+            await asyncio.gather(*(update_channel(messages) for messages in channels.values()))
+            if hashes:
+                await rules.set_link_hashes("auto_update", hashes)
+
             if len(s_embed.fields) == 0:
                 s_embed.description = _('Updated messages')
             else:
                 s_embed.description = _('Some messages could not be found, please remove them manually')
+            if skipped:
+                # Skipped messages are not fetched, so a deleted one only shows up with force
+                s_embed.set_footer(text=_(
+                    '{count} messages were already up to date, use force to also check that they still exist'
+                ).format(count=skipped))
 
             if not nomsg:
+                await progress.edit(content="{} ({}/{})".format(_('Updating messages'), done, len(to_update)))
                 await ctx.send(embed=s_embed)
             return
 
+    @staticmethod
+    def _render_hash(text: str, date: str, content: str = None) -> str:
+        """Fingerprint of what a auto-update message would be edited to"""
+        return hashlib.sha1("\0".join([text, date or "", content or ""]).encode()).hexdigest()
+
+    async def _search_embed(self, hits, default_rule=None):
+        rulesets = {}
+        for name, line in hits:
+            rulesets.setdefault(name, []).append(line)
+        embed = await self._create_embed()
+        embed.title = _('Rules matching your search')
+        for name, lines in rulesets.items():
+            title = name.capitalize() if name != default_rule else "•" + name.capitalize()
+            embed.add_field(name=title, value="\n".join(lines)[:1024], inline=False)
+        return embed
+
     async def _get_linked_message(self, ctx, message_link):
         try:
             message_split = message_link.split("/")
@@ -74,6 +129,17 @@ class RuleHelper:
         except Exception:
             return None
 
+    async def _rule_embed(self, cache, name: str, text: str, date: str = None, kind: str = "full"):
+        """Returns a copy of the rendered ruleset embed, only building it when it is not cached"""
+        if cache is None:
+            return await self._create_embed(text, date)
+        key = (name, date, kind)
+        embed = cache.get_embed(key)
+        if embed is None:
+            embed = await self._create_embed(text, date)
+            cache.put_embed(key, embed)
+        return embed.copy()
+
     async def _create_embed(self, text: str = None, date: str = None):
         avatar = self.bot.user.display_avatar.replace(static_format="png", size=1024).url
         embed = discord.Embed(color=0xD9C04D)
@@ -86,22 +152,25 @@ class RuleHelper:
         return embed
 
     async def _remove_reactions(self, ctx, rules, to_match):
-        react_rules = await rules.get_settings("react_rules")
+        if isinstance(to_match, dict):
+            react_rules = await rules.get_links("react_rules", message=to_match["message"])
+        else:
+            react_rules = await rules.get_links("react_rules", name=to_match)
+        emoji = await rules.get_settings("alt_emoji")
         for rule in react_rules:
-            if rule["name"] == to_match or rule["link"] == to_match:
-                msg = await self._get_linked_message(ctx, rule["link"])
-                if msg is None:
-                    await ctx.send("{}:\n<{}>\n{}".format(
-                        _('Could not remove the reactions from the following message'),
-                        to_match["link"],
-                        _('Ensure the bot has access, or delete the reaction manually')
-                    )
-                    )
-                    continue
-
-                await msg.remove_reaction(await ctx.bot.config.guild(ctx.guild).get_raw("alt_emoji"), self.bot.user)
-
-                await asyncio.sleep(2)
+            msg = await self._get_linked_message(ctx, rule["link"])
+            if msg is None:
+                await ctx.send("{}:\n<{}>\n{}".format(
+                    _('Could not remove the reactions from the following message'),
+                    rule["link"],
+                    _('Ensure the bot has access, or delete the reaction manually')
+                )
+                )
+                continue
+
+            await msg.remove_reaction(emoji, self.bot.user)
+
+            await asyncio.sleep(2)
 
     async def _format_message_link(self, msg):
         return {"channel": msg.channel.id, "message": msg.id,
@@ -0,0 +1,83 @@
+import re
+
+# Lookahead, so a rule defined later on the same line is still indexed
+RULE_PATTERN = re.compile(r"(?=(§ *(\d+)([a-z]?): [\S ]*))")
+TOKEN_PATTERN = re.compile(r"^(\d+)([a-z]?)(?:-(\d+))?$")
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class RuleIndex:
+    """Maps the rule numbers in a ruleset to the line they are defined on"""
+
+    def __init__(self, rule_text: str = None):
+        self.lines = {}
+        self.highest = 0
+        for match in RULE_PATTERN.finditer(rule_text or ""):
+            line, number, letter = match.groups()
+            self.lines.setdefault(number, line)
+            if letter:
+                self.lines.setdefault(number + letter, line)
+            self.highest = max(self.highest, int(number))
+
+    @staticmethod
+    def is_rule_token(token: str) -> bool:
+        """Checks if the token looks like `4`, `4b` or `3-9`"""
+        return TOKEN_PATTERN.match(token) is not None
+
+    def _keys(self, token: str):
+        match = TOKEN_PATTERN.match(token)
+        if match is None:
+            return [token]
+        start, letter, end = match.groups()
+        if end is None:
+            return [start + letter]
+        # Never walk further than the highest rule in the ruleset
+        return [str(number) for number in range(int(start), min(int(end), self.highest) + 1)]
+
+    def lookup(self, tokens) -> list:
+        """Returns the lines for the requested rules, in the requested order"""
+        found = {}
+        for token in tokens:
+            for key in self._keys(token):
+                line = self.lines.get(key)
+                if line is not None:
+                    found.setdefault(line, None)
+        return list(found)
+
+
+class SearchIndex:
+    """Inverted index from words to the rule lines containing them, across the rulesets of a guild"""
+
+    def __init__(self):
+        self.postings = {}
+        self.terms = {}
+
+    @staticmethod
+    def words(text: str) -> set:
+        return set(WORD_PATTERN.findall(text.lower()))
+
+    def add(self, name: str, index: RuleIndex):
+        """Indexes the rule lines of one ruleset, replacing what was indexed for it before"""
+        self.remove(name)
+        terms = set()
+        for line in set(index.lines.values()):
+            for word in self.words(line):
+                self.postings.setdefault(word, {}).setdefault(name, set()).add(line)
+                terms.add(word)
+        self.terms[name] = terms
+
+    def remove(self, name: str):
+        for word in self.terms.pop(name, ()):
+            rulesets = self.postings[word]
+            rulesets.pop(name, None)
+            if not rulesets:
+                del self.postings[word]
+
+    def search(self, query: str, limit: int = 10) -> list:
+        """Returns (ruleset, line) pairs, the lines matching most of the query first"""
+        scores = {}
+        for word in self.words(query):
+            for name, lines in self.postings.get(word, {}).items():
+                for line in lines:
+                    scores[(name, line)] = scores.get((name, line), 0) + 1
+        return sorted(scores, key=lambda hit: (-scores[hit], hit))[:limit]
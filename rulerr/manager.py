@@ -1,15 +1,66 @@
+from contextlib import asynccontextmanager
 from datetime import datetime
 
 
 class RuleManager:
-    def __init__(self, config):
+    def __init__(self, config, cache=None):
         self.config = config
+        self.cache = cache
+        self._batched = 0
+        self._snapshot = None
+
+    def _invalidate(self):
+        self._snapshot = None
+        if self.cache is not None:
+            self.cache.invalidate()
+
+    def _cache_rule(self, name, rule):
+        self._snapshot = None
+        if self.cache is not None and self.cache.loaded:
+            self.cache.set_rule(name, rule)
+
+    def _cache_link(self, setting, message, name, removed=False):
+        self._snapshot = None
+        if self.cache is not None and self.cache.loaded:
+            if removed:
+                self.cache.remove_link(setting, message, name)
+            else:
+                self.cache.add_link(setting, message, name)
+
+    async def _link_keys(self, setting, name, links):
+        """The message IDs linked to the ruleset, from the name index of the cache when there is one"""
+        if self.cache is None:
+            return [key for key, link in links.items() if link["name"] == name]
+        cache = await self.cache.get()
+        return list(cache.link_names[setting].get(name, ()))
+
+    @asynccontextmanager
+    async def batch(self):
+        """Serves the reads inside the block from one snapshot of the guild settings"""
+        self._batched += 1
+        try:
+            yield self
+        finally:
+            self._batched -= 1
+            if not self._batched:
+                self._snapshot = None
+
+    async def _read(self, *path):
+        if not self._batched:
+            return await self.config.get_raw(*path)
+        # Writes drops the snapshot, so the next read inside the batch sees them
+        if self._snapshot is None:
+            self._snapshot = await self.config.all()
+        value = self._snapshot
+        for key in path:
+            value = value[key]
+        return value
 
     async def add_rule(self, name, rule_text, alternaterule: str = None):
         if name is not None:
             name = name.lower()
 
-        if any(rule for rule in await self.config.rules() if rule == name):
+        if name in await self._read("rules"):
             return False
 
         rule_text = rule_text if rule_text else ""
@@ -20,12 +71,13 @@ class RuleManager:
                 "alternate": alternaterule,
                 "edited": str(datetime.utcnow())
             }
+        self._cache_rule(name, rules[name])
         return True
 
     async def remove_rule(self, name, alternate: bool = False):
         if name is not None:
             name = name.lower()
-        _rule = await self.config.rules.get_raw(name)
+        _rule = await self._read("rules", name)
         if _rule is not None:
             if alternate:
                 await self.config.rules.set_raw(name, "alternate", value=None)
@@ -34,8 +86,9 @@ class RuleManager:
                 await self.config.rules.clear_raw(name)
                 await self.remove_link_setting("auto_update", "name", name)
                 await self.remove_link_setting("react_rules", "name", name)
-                if name == await self.config.default_rule():
+                if name == await self._read("default_rule"):
                     await self.config.default_rule.set(None)
+            self._invalidate()
             return True
         return False
 
@@ -49,6 +102,7 @@ class RuleManager:
                 else:
                     _rule[name]["rule_text"] = new_rule_text
                 _rule[name]["edited"] = str(datetime.utcnow())
+            self._cache_rule(name, _rule[name])
             return True
         except KeyError:
             return False
@@ -56,27 +110,26 @@ class RuleManager:
     async def get_rule_text(self, name, alternate: bool = False):
         if name is not None:
             name = name.lower()
-        _rule = self.config.rules
         try:
-            if alternate:
-                return await _rule.get_raw(name, "alternate"), await _rule.get_raw(name, "edited")
-            else:
-                return await _rule.get_raw(name, "rule_text"), await _rule.get_raw(name, "edited")
+            _rule = await self._read("rules", name)
         except KeyError:
             return None, None
+        return _rule.get("alternate" if alternate else "rule_text"), _rule.get("edited")
 
     async def get_rules_formatted(self, alternate: bool = False):
-        rules = await self._get_rule_names(alternate)
+        async with self.batch():
+            rules = await self._get_rule_names(alternate)
+            default_rule = await self._read("default_rule")
         formatted_rules = ""
         for rule in rules:
-            if rule == await self.config.default_rule():
+            if rule == default_rule:
                 formatted_rules = "•" + rule.capitalize() + "\n" + formatted_rules
             else:
                 formatted_rules += "•" + rule.capitalize() + "\n"
         return formatted_rules
 
     async def _get_rule(self, name=None):
-        return await self.config.rules.get_raw(name)
+        return await self._read("rules", name)
 
     async def add_link_setting(self, setting, name, link):
         if name is not None:
@@ -84,12 +137,12 @@ class RuleManager:
         # pylint: disable=unused-variable
         rule, date = await self.get_rule_text(name)
         if rule is not None:
-            if any(msg for msg in await self.config.get_raw(setting) if msg["link"] == link.get("link")):
-                return -1
-            _update = await self.config.get_raw(setting)
-            _update.append({"name": name, "channel": link.get("channel"),
-                            "message": link.get("message"), "link": link.get("link")})
-            await self.config.set_raw(setting, value=_update)
+            async with self.config.get_attr(setting)() as links:
+                if str(link.get("message")) in links:
+                    return -1
+                links[str(link.get("message"))] = {"name": name, "channel": link.get("channel"),
+                                                   "message": link.get("message"), "link": link.get("link")}
+            self._cache_link(setting, str(link.get("message")), name)
             return True
         return False
 
@@ -97,27 +150,48 @@ class RuleManager:
         if to_match is not None:
             to_match = to_match.lower()
 
-        removed = False
-        for message in reversed(await self.config.get_raw(setting)):
-            if message[match_type] == to_match:
-                _update = await self.config.get_raw(setting)
-                _update.remove(message)
-                await self.config.set_raw(setting, value=_update)
-                removed = True
-        return removed
+        async with self.config.get_attr(setting)() as links:
+            if match_type == "link":
+                # Links are stored by message ID, which is the last part of the link
+                keys = [to_match.rstrip("/").split("/")[-1]]
+            elif match_type == "name":
+                keys = await self._link_keys(setting, to_match, links)
+            else:
+                keys = [key for key, message in links.items() if message[match_type] == to_match]
+            removed = {key: links.pop(key) for key in keys if key in links}
+        for key, link in removed.items():
+            self._cache_link(setting, key, link["name"], removed=True)
+        return bool(removed)
+
+    async def get_links(self, setting, name=None, message=None):
+        """Returns the linked messages, optionally only those for a ruleset or a message ID"""
+        links = await self._read(setting)
+        if message is not None:
+            return [links[str(message)]] if str(message) in links else []
+        if name is None:
+            return list(links.values())
+        return [links[key] for key in await self._link_keys(setting, name, links) if key in links]
+
+    async def set_link_hashes(self, setting, hashes):
+        async with self.config.get_attr(setting)() as links:
+            for message, rendered in hashes.items():
+                if str(message) in links:
+                    links[str(message)]["hash"] = rendered
+        self._snapshot = None
 
     async def get_settings(self, *setting):
-        return await self.config.get_raw(*setting)
+        return await self._read(*setting)
 
     async def change_setting(self, setting, value):
         await self.config.set_raw(setting, value=value)
+        self._invalidate()
 
     async def _get_rule_names(self, alternate):
+        rules = await self._read("rules")
         if alternate:
-            return [rule for rule in await self.config.rules()
-                    if await self.config.get_raw("rules", rule, "alternate") is not None]
+            return [rule for rule in rules if rules[rule].get("alternate") is not None]
         else:
-            return [rule for rule in await self.config.rules()]
+            return [rule for rule in rules]
 
     async def remove_duplicates(self, dupe_list):
         seen = {}
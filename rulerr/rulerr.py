@@ -8,10 +8,13 @@ from redbot.core.utils.predicates import ReactionPredicate
 
 import asyncio
 import logging
-import re
 from typing import Optional, Union
 
+from .agreement import AgreementQueue
+from .cache import RuleCache
+from .delivery import DMDelivery
 from .helpers import RuleHelper
+from .index import RuleIndex
 from .manager import RuleManager
 
 _ = Translator('Rulerr', __file__)
@@ -29,12 +32,12 @@ class Rulerr(commands.Cog):
             "agreement_msg": {},
             "agreement_role": "",
             "alt_emoji": "\N{INCOMING ENVELOPE}",
-            "auto_update": [],
+            "auto_update": {},
             "channel": {},
             "default_rule": None,
             "emoji": "\N{THUMBS UP SIGN}",
             "interface_lang": "en_en",
-            "react_rules": [],
+            "react_rules": {},
             "rule_prefix": "§",
             "rules": {},
         }
@@ -42,6 +45,17 @@ class Rulerr(commands.Cog):
         self.log.setLevel(logging.INFO)
         self.config.register_guild(**default_settings)
         self.helper = RuleHelper(bot)
+        self.cache = RuleCache(self.config)
+        self.agreement = AgreementQueue(self.log)
+        self.dm = DMDelivery(self.helper, self.log)
+
+    async def initialize(self):
+        """ cache preloading """
+        await self.cache.initialize()
+
+    async def cog_unload(self):
+        self.agreement.cancel()
+        self.dm.cancel()
 
     async def red_delete_data_for_user(self, **kwargs):
         """ Nothing to delete """
@@ -50,16 +64,19 @@ class Rulerr(commands.Cog):
     async def migrate(self):
         config = Config.get_conf(self, identifier=9783465975)
         guild_ids = await config.all_guilds()
-        for guild in guild_ids:
-            async with config.guild_from_id(guild).auto_update() as auto_update:
-                print(auto_update)
-                for index, channel in enumerate(auto_update):
-                    channel["link"] = channel["link"].replace("discordapp", "discord")
-                    auto_update[index] = channel
-                print(auto_update)
+        for guild, data in guild_ids.items():
+            for setting in ("auto_update", "react_rules"):
+                links = data.get(setting)
+                # Linked messages used to be stored as lists, they are now keyed by message ID
+                if isinstance(links, list):
+                    migrated = {}
+                    for link in links:
+                        link["link"] = link["link"].replace("discordapp", "discord")
+                        migrated[str(link["message"])] = link
+                    await config.guild_from_id(guild).set_raw(setting, value=migrated)
 
     @commands.guild_only()
-    @commands.command(name="rule")
+    @commands.group(name="rule", invoke_without_command=True)
     async def rules(self, ctx, user: Optional[discord.Member] = None, ruleset: Union[int, str] = None, *, num: str = None):
         """Command to explicit get the rules in a ruleset"""
 
@@ -73,16 +90,23 @@ class Rulerr(commands.Cog):
         embed = None
 
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
+        cache = await self.cache.guild(ctx.guild).get()
+        rules = RuleManager(config, cache)
+
+        # Ranges and sub-rules like 3-9 or 4b are not ints, but still belongs to the default ruleset
+        if isinstance(law, str) and law not in cache.rules and RuleIndex.is_rule_token(law):
+            num = law if num is None else law + " " + num
+            law = cache.default_rule
 
         if isinstance(law, int):
             if num is None:
                 num = str(law)
             else:
                 num = str(law) + " " + num
-            law = await rules.get_settings("default_rule")
+            law = cache.default_rule
 
-        rule_text, date = await rules.get_rule_text(law)
+        rule = cache.rules.get(law, {})
+        rule_text, date = rule.get("rule_text"), rule.get("edited")
 
         formatted = await rules.get_rules_formatted()
 
@@ -98,33 +122,35 @@ class Rulerr(commands.Cog):
 
         # Get only specified rules
         if num is not None:
-            partial_rules = ""
-
-            no_dupes = await rules.remove_duplicates(num.split())
-
-            for rule in no_dupes:
-                ruleregex = r"(§ *" + re.escape(rule) + r"[a-z]?: [\S ]*)"
-                m = re.search(ruleregex, rule_text)
-                if m is not None:
-                    partial_rules += m.groups()[0] + "\n"
+            partial_rules = "".join(line + "\n" for line in cache.indexes[law].lookup(num.split()))
 
             if partial_rules == "":
                 await ctx.send(_('Could not find the rule you were looking for'))
-            elif law != await rules.get_settings("default_rule"):
-                embed = await self.helper._create_embed(
-                    "**{_txt} {law}**\n".format(
-                        _txt=_('The rules for the ruleset'), law=law) + partial_rules
+            elif law != cache.default_rule:
+                embed = await self.helper._rule_embed(
+                    cache, law, "**{_txt} {law}**\n".format(
+                        _txt=_('The rules for the ruleset'), law=law) + partial_rules, kind=partial_rules
                 )
             else:
-                embed = await self.helper._create_embed(partial_rules, date)
+                embed = await self.helper._rule_embed(cache, law, partial_rules, date, kind=partial_rules)
         else:
-            embed = await self.helper._create_embed(rule_text, date)
+            embed = await self.helper._rule_embed(cache, law, rule_text, date)
         if embed:
             embed.title = "Someone wants to remind you about the rules:"
             await ctx.send(content=content, embed=embed)
         else:
             await ctx.send("Could not build rule embed")
 
+    @rules.command(name="search")
+    async def rule_search(self, ctx, *, terms: str):
+        """Search the rulesets for rules containing the terms"""
+
+        cache = await self.cache.guild(ctx.guild).get()
+        hits = cache.search.search(terms)
+        if not hits:
+            return await ctx.send(_('Could not find the rule you were looking for'))
+        await ctx.send(embed=await self.helper._search_embed(hits, cache.default_rule))
+
     @commands.guild_only()
     @checks.mod_or_permissions(manage_messages=True)
     @commands.group(name="rset")
@@ -140,7 +166,7 @@ class Rulerr(commands.Cog):
     @_rule_settings.command(name="list")
     async def listrules(self, ctx):
         """Lists the current rulesets"""
-        rules = RuleManager(self.config.guild(ctx.guild))
+        rules = RuleManager(self.config.guild(ctx.guild), self.cache.guild(ctx.guild))
         await ctx.send("**{}**:\n{}".format(
             _('The following rulesets are configured'), await rules.get_rules_formatted()))
 
@@ -153,8 +179,13 @@ class Rulerr(commands.Cog):
         if law is not None:
             law = law.lower()
 
+        if law == "search":
+            # `[p]rule search` runs the search subcommand, so the ruleset could never be shown
+            return await ctx.send(embed=await self.helper._create_embed(
+                _('{ruleset} is reserved, pick another name').format(ruleset=law)))
+
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
+        rules = RuleManager(config, self.cache.guild(ctx.guild))
         added = await rules.add_rule(law, newrule)
         new_rule = await config.rules.get_raw(law)
 
@@ -199,7 +230,7 @@ class Rulerr(commands.Cog):
             law = law.lower()
 
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
+        rules = RuleManager(config, self.cache.guild(ctx.guild))
         await self.helper._remove_reactions(ctx, rules, law)
         try:
             await rules.remove_rule(law)
@@ -217,7 +248,7 @@ class Rulerr(commands.Cog):
             law = law.lower()
 
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
+        rules = RuleManager(config, self.cache.guild(ctx.guild))
         try:
             await rules.edit_rule(law, newrule)
             await self.helper._update_messages(ctx, rules)
@@ -234,18 +265,19 @@ class Rulerr(commands.Cog):
             law = law.lower()
 
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
-        # pylint: disable=unused-variable
-        rule_text, date = await rules.get_rule_text(law)
-
-        if rule_text is None:
-            return await ctx.send(
-                "{_not}.\n\n**{_these}**:\n{_formatted}".format(
-                    _not=_('This ruleset is not configured'),
-                    _these=_('The following rulesets are configured'),
-                    _formatted=await rules.get_rules_formatted()
+        rules = RuleManager(config, self.cache.guild(ctx.guild))
+        async with rules.batch():
+            # pylint: disable=unused-variable
+            rule_text, date = await rules.get_rule_text(law)
+
+            if rule_text is None:
+                return await ctx.send(
+                    "{_not}.\n\n**{_these}**:\n{_formatted}".format(
+                        _not=_('This ruleset is not configured'),
+                        _these=_('The following rulesets are configured'),
+                        _formatted=await rules.get_rules_formatted()
+                    )
                 )
-            )
         await rules.change_setting("default_rule", law)
         await ctx.send(_('{ruleset} is now the default ruleset').format(ruleset=law))
 
@@ -257,7 +289,7 @@ class Rulerr(commands.Cog):
             prefix = prefix.lower()
 
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
+        rules = RuleManager(config, self.cache.guild(ctx.guild))
 
         await rules.change_setting("rule_prefix", prefix)
         await ctx.send(_('{prefix} is now the default prefix').format(prefix=prefix))
@@ -278,24 +310,26 @@ class Rulerr(commands.Cog):
             law = law.lower()
 
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
-        rule_text, date = await rules.get_rule_text(law)
-
-        if rule_text is None:
-            return await ctx.send(
-                "{_not}.\n\n**{_these}**:\n{_formatted}".format(
-                    _not=_('This ruleset is not configured'),
-                    _these=_('The following rulesets are configured'),
-                    _formatted=await rules.get_rules_formatted()
+        rules = RuleManager(config, self.cache.guild(ctx.guild))
+        async with rules.batch():
+            rule_text, date = await rules.get_rule_text(law)
+
+            if rule_text is None:
+                return await ctx.send(
+                    "{_not}.\n\n**{_these}**:\n{_formatted}".format(
+                        _not=_('This ruleset is not configured'),
+                        _these=_('The following rulesets are configured'),
+                        _formatted=await rules.get_rules_formatted()
+                    )
                 )
-            )
 
         if rule_text == "":
             return await ctx.send(_('This ruleset is completely empty'))
 
-        embed = await self.helper._create_embed(rule_text, date)
+        embed = await self.helper._rule_embed(rules.cache, law, rule_text, date)
         msg = await ctx.send(embed=embed)
         await rules.add_link_setting("auto_update", law, await self.helper._format_message_link(msg))
+        await rules.set_link_hashes("auto_update", {msg.id: self.helper._render_hash(rule_text, date)})
 
         conf_msg = await ctx.send(_('The message now updates automatically'))
         await asyncio.sleep(5)
@@ -306,7 +340,7 @@ class Rulerr(commands.Cog):
         """Remove a message from the list of messages that automatically updates"""
 
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
+        rules = RuleManager(config, self.cache.guild(ctx.guild))
         removed = await rules.remove_link_setting("auto_update", "link", link)
         if removed:
             await ctx.send(_('Message removed from list'))
@@ -330,7 +364,7 @@ class Rulerr(commands.Cog):
             return await ctx.send(_('This only works on messages owned by the bot'))
 
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
+        rules = RuleManager(config, self.cache.guild(ctx.guild))
         added = await rules.add_link_setting('auto_update', law, await self.helper._format_message_link(msg))
 
         if added == -1:
@@ -347,8 +381,8 @@ class Rulerr(commands.Cog):
         """Sends a list of the messages set up to automatically update"""
 
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
-        auto_update_messages = await rules.get_settings("auto_update")
+        rules = RuleManager(config, self.cache.guild(ctx.guild))
+        auto_update_messages = await rules.get_links("auto_update")
 
         if len(auto_update_messages) == 0:
             return await ctx.send(_('No message is currently set up for automatic updates'))
@@ -364,11 +398,14 @@ class Rulerr(commands.Cog):
         await ctx.send(embed=embed)
 
     @ _auto_settings.command(name="fix")
-    async def fixauto(self, ctx):
-        """Forces a update for automatic messages"""
+    async def fixauto(self, ctx, force: bool = False):
+        """Forces a update for automatic messages
 
-        rules = RuleManager(self.config.guild(ctx.guild))
-        await self.helper._update_messages(ctx, rules)
+        Messages already showing the current ruleset are skipped, unless force is set.
+        Skipped messages are not looked up, so use force to find messages that were deleted"""
+
+        rules = RuleManager(self.config.guild(ctx.guild), self.cache.guild(ctx.guild))
+        await self.helper._update_messages(ctx, rules, force=force)
 
     @ commands.guild_only()
     @ commands.has_permissions(manage_messages=True)
@@ -385,7 +422,7 @@ class Rulerr(commands.Cog):
         if law is not None:
             law = law.lower()
 
-        rules = RuleManager(self.config.guild(ctx.guild))
+        rules = RuleManager(self.config.guild(ctx.guild), self.cache.guild(ctx.guild))
         try:
             await rules.edit_rule(law, newrule, alternate=True)
             await ctx.send(_('Alternate ruleset updated'))
@@ -401,7 +438,7 @@ class Rulerr(commands.Cog):
         if law is not None:
             law = law.lower()
 
-        rules = RuleManager(self.config.guild(ctx.guild))
+        rules = RuleManager(self.config.guild(ctx.guild), self.cache.guild(ctx.guild))
         try:
             await rules.remove_rule(law, alternate=True)
             await ctx.send(_('Alternate ruleset removed'))
@@ -417,21 +454,23 @@ class Rulerr(commands.Cog):
         if law is not None:
             law = law.lower()
 
-        rules = RuleManager(self.config.guild(ctx.guild))
-        # pylint: disable=unused-variable
-        rule_text, date = await rules.get_rule_text(law, alternate=True)
-        if rule_text is not None:
-            await ctx.send("```\n" + rule_text + "\n```")
-        else:
-            return await ctx.send("**{_txt}:**\n{_list}".format(_txt=_('Lists all alternate ruleset for this guild'),
-                                                                _list=await rules.get_rules_formatted(alternate=True)))
+        rules = RuleManager(self.config.guild(ctx.guild), self.cache.guild(ctx.guild))
+        async with rules.batch():
+            # pylint: disable=unused-variable
+            rule_text, date = await rules.get_rule_text(law, alternate=True)
+            if rule_text is not None:
+                await ctx.send("```\n" + rule_text + "\n```")
+            else:
+                return await ctx.send("**{_txt}:**\n{_list}".format(
+                    _txt=_('Lists all alternate ruleset for this guild'),
+                    _list=await rules.get_rules_formatted(alternate=True)))
 
     @ _alt_settings.command(name="auto_list")
     async def _react_list(self, ctx):
         """Lists the alternate rulesets set up with reactions"""
 
-        rules = RuleManager(self.config.guild(ctx.guild))
-        react_messages = await rules.get_settings("react_rules")
+        rules = RuleManager(self.config.guild(ctx.guild), self.cache.guild(ctx.guild))
+        react_messages = await rules.get_links("react_rules")
 
         list_message = "**{}:**\n".format(
             _('Reaction-messages set to automatically update'))
@@ -460,7 +499,7 @@ class Rulerr(commands.Cog):
             return await ctx.send(_('This only works on messages owned by the bot'))
 
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
+        rules = RuleManager(config, self.cache.guild(ctx.guild))
         added = await rules.add_link_setting("react_rules", law, await self.helper._format_message_link(msg))
 
         if added == -1:
@@ -480,7 +519,7 @@ class Rulerr(commands.Cog):
     async def unlink_alternate(self, ctx, message_link):
         """Remove a react-message from the list of messages that automatically updates"""
 
-        rules = RuleManager(self.config.guild(ctx.guild))
+        rules = RuleManager(self.config.guild(ctx.guild), self.cache.guild(ctx.guild))
 
         msg = await self.helper._get_linked_message(ctx, message_link)
         if msg is None:
@@ -506,7 +545,7 @@ class Rulerr(commands.Cog):
         """Sets the reaction based rule-agreement"""
 
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
+        rules = RuleManager(config, self.cache.guild(ctx.guild))
 
         msg = await self.helper._get_linked_message(ctx, message_link)
 
@@ -517,7 +556,7 @@ class Rulerr(commands.Cog):
         elif msg.author != self.bot.user:
             return await ctx.send(_('This only works on messages owned by the bot'))
 
-        if not [rule for rule in await rules.get_settings("auto_update") if rule["message"] == int(msg.id)]:
+        if not await rules.get_links("auto_update", message=msg.id):
             _yes = await ctx.send(_('This is not a auto updating message, '
                                     'would you like to make it one based on the default rule?'))
             start_adding_reactions(_yes, ReactionPredicate.YES_OR_NO_EMOJIS)
@@ -565,7 +604,7 @@ class Rulerr(commands.Cog):
         """Gets the message for the reaction based rule-agreement"""
 
         config = self.config.guild(ctx.guild)
-        rules = RuleManager(config)
+        rules = RuleManager(config, self.cache.guild(ctx.guild))
 
         try:
             link = await rules.get_settings("agreement_msg", "link")
@@ -588,6 +627,7 @@ class Rulerr(commands.Cog):
 
         config = self.config.guild(ctx.guild)
         await config.agreement_role.set(role.id)
+        self.cache.guild(ctx.guild).invalidate()
         msg_txt = role.mention + " " + \
             _('is now the role assigned on agreement')
         embed = await self.helper._create_embed(text=msg_txt)
@@ -606,14 +646,29 @@ class Rulerr(commands.Cog):
             pass
 
         await config.agreement_msg.clear()
+        self.cache.guild(ctx.guild).invalidate()
 
         embed = await self.helper._create_embed(_('Cleared the agreement message'))
         await ctx.send(embed=embed)
 
+    @ _react_settings.command(name="stats")
+    async def react_stats(self, ctx):
+        """Shows the backlog of the agreement role queue"""
+
+        stats = self.agreement.guild(ctx.guild).stats()
+        embed = await self.helper._create_embed()
+        embed.title = _('Agreement queue')
+        embed.add_field(name=_('Waiting'), value=stats["depth"])
+        embed.add_field(name=_('Granted'), value=stats["granted"])
+        for key, name in (("latency_p50", _('Median wait')), ("latency_max", _('Longest wait'))):
+            value = stats[key]
+            embed.add_field(name=name, value=f"{value:.1f}s" if value is not None else "-")
+        await ctx.send(embed=embed)
+
     @ commands.Cog.listener()
     async def on_message(self, message):
 
-        if message.author.id == self.bot.user.id:
+        if message.guild is None or message.author.id == self.bot.user.id:
             return
 
         # if not isinstance(message.channel, discord.TextChannel):
@@ -621,8 +676,10 @@ class Rulerr(commands.Cog):
 
         content = message.content
 
-        config = self.config.guild(message.guild)
-        prefix = await config.get_raw("rule_prefix")
+        cache = self.cache.guild(message.guild)
+        if not cache.loaded:
+            await cache.load()
+        prefix = cache.prefix
 
         if content == "" or content[0] != prefix:
             return
@@ -633,16 +690,21 @@ class Rulerr(commands.Cog):
         if num == "":
             return
 
+        # §?term searches every ruleset instead of looking up a number
+        if num[0] == "?":
+            hits = cache.search.search(num[1:])
+            if hits:
+                await message.channel.send(embed=await self.helper._search_embed(hits, cache.default_rule))
+            return
+
         # crap way to avoid running when a command runs
-        try:
-            int(num.split()[0])
-        except ValueError:
+        if not num.split() or not RuleIndex.is_rule_token(num.split()[0]):
             return
 
-        rules = RuleManager(config)
+        rules = RuleManager(self.config.guild(message.guild), cache)
 
-        lov = await rules.get_settings("default_rule")
-        rule_text, date = await rules.get_rule_text(lov)
+        rule = cache.rules.get(cache.default_rule, {})
+        rule_text, date = rule.get("rule_text"), rule.get("edited")
 
         context = message.channel
 
@@ -660,13 +722,7 @@ class Rulerr(commands.Cog):
             return await context.send(_('This ruleset is completely empty'))
 
         # Get only specified rules
-        partial_rules = ""
-        no_dupes = await rules.remove_duplicates(num.split())
-        for rule in no_dupes:
-            ruleregex = r"(§ *" + re.escape(rule) + r"[a-z]?: [\S ]*)"
-            m = re.search(ruleregex, rule_text)
-            if m is not None:
-                partial_rules += m.groups()[0] + "\n"
+        partial_rules = "".join(line + "\n" for line in cache.indexes[cache.default_rule].lookup(num.split()))
 
         if partial_rules == "":
             return
@@ -676,118 +732,86 @@ class Rulerr(commands.Cog):
         text = "{}! {}".format(', '.join(usrs), _(
             'Hey please read the rules')) if usrs else None
 
-        embed = await self.helper._create_embed(partial_rules, date)
+        embed = await self.helper._rule_embed(cache, cache.default_rule, partial_rules, date, kind=partial_rules)
         embed.title = "Someone wants to remind you about the rules:"
         await context.send(content=text, embed=embed)
 
-    @ commands.Cog.listener(name="on_raw_reaction_add")
-    async def on_agreement_reaction(self, payload):
-        if payload.guild_id is None:
-            return
-
-        channel = self.bot.get_channel(payload.channel_id)
-        msg = await channel.fetch_message(payload.message_id)
-
-        config = self.config.guild(msg.guild)
-        emoji = await config.get_raw("emoji")
-        role = await config.get_raw("agreement_role")
-
-        if not role:
-            return
-
-        role = msg.guild.get_role(role)
-
-        if not await config.get_raw("agreement_msg"):
-            return
-        if payload.message_id != await config.get_raw("agreement_msg", "message"):
-            return
-
-        if str(payload.emoji) == emoji:
-            if payload.event_type == "REACTION_ADD" and payload.user_id != self.bot.user.id:
-                user = payload.member
-                try:
-                    await user.add_roles(role, reason=_('Agreed to the rules'))
-                    await msg.remove_reaction(emoji, user)
-                except Exception:
-                    if msg.channel.permissions_for(user).send_messages:
-                        await channel.send("{} {}".format(_('Tell a mod to fix my perms'), user.mention))
-                    else:
-                        self.log.info(
-                            "The bot is missing perms in %s to agree" % (msg.guild.name))
-        else:
-            if payload.event_type == "REACTION_ADD" and payload.user_id != self.bot.user.id:
-                await msg.remove_reaction(payload.emoji, payload.member)
-
     @ commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
-        await self.alt_action(payload)
+        await self._on_watched_reaction(payload)
 
     @ commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload):
-        await self.alt_action(payload)
+        await self._on_watched_reaction(payload)
 
     @ commands.Cog.listener()
     async def on_raw_reaction_clear(self, payload):
-        channel = self.bot.get_channel(payload.channel_id)
-        msg = await channel.fetch_message(payload.message_id)
-        config = self.config.guild(msg.guild)
-
-        rules = RuleManager(config)
+        await self._on_watched_reaction(payload)
 
-        emoji = await config.get_raw("alt_emoji")
-        react_messages = await rules.get_settings("react_rules")
-
-        if payload.message_id not in react_messages:
+    async def _on_watched_reaction(self, payload):
+        """Single entrypoint for the reaction listeners, only fetches messages the cog watches"""
+        if payload.guild_id is None:
             return
-        rules = RuleManager(config)
-        await asyncio.sleep(1)
-        await msg.add_reaction(emoji)
 
-    async def alt_action(self, payload):
-        if payload.guild_id is None:
+        cache = await self.cache.guild_from_id(payload.guild_id).get()
+        if payload.message_id not in cache.watched:
             return
 
         channel = self.bot.get_channel(payload.channel_id)
-        msg = await channel.fetch_message(payload.message_id)
+        # Adding and removing reactions works on a partial message, so nothing needs to be fetched
+        partial = channel.get_partial_message(payload.message_id)
+
+        if isinstance(payload, discord.RawReactionClearEvent):
+            if payload.message_id in cache.react_rules:
+                await partial.add_reaction(cache.alt_emoji)
+            return
 
-        config = self.config.guild(msg.guild)
-        rules = RuleManager(config)
+        if payload.message_id == cache.agreement_msg:
+            await self.on_agreement_reaction(payload, partial, cache)
+        if payload.message_id in cache.react_rules:
+            await self.alt_action(payload, partial, cache)
 
-        emoji = await config.get_raw("alt_emoji")
-        react_messages = await rules.get_settings("react_rules")
+    async def on_agreement_reaction(self, payload, msg, cache):
+        emoji = cache.emoji
+        role = cache.agreement_role
 
-        if payload.message_id not in [rmessage["message"] for rmessage in react_messages]:
+        if not role:
+            return
+
+        role = msg.guild.get_role(role)
+        if role is None:
             return
 
+        if payload.event_type != "REACTION_ADD" or payload.user_id == self.bot.user.id:
+            return
+
+        if str(payload.emoji) == emoji:
+            self.agreement.guild(msg.guild).submit(payload.member, msg, role, emoji)
+        else:
+            await msg.remove_reaction(payload.emoji, payload.member)
+
+    async def alt_action(self, payload, msg, cache):
+        emoji = cache.alt_emoji
+
         if str(payload.emoji) == emoji:
             if payload.event_type == "REACTION_REMOVE" and payload.user_id == self.bot.user.id:
                 await msg.add_reaction(emoji)
 
             if payload.event_type == "REACTION_ADD" and payload.user_id != self.bot.user.id:
-                user = self.bot.get_user(payload.user_id)
+                user = payload.member or self.bot.get_user(payload.user_id)
                 try:
                     await msg.remove_reaction(emoji, user)
                 except Exception:
-                    await channel.send("{} {}".format(_('Tell a mod to fix my perms'), user.mention))
-                await self._dm_rules(rules, user, msg)
+                    await msg.channel.send("{} {}".format(_('Tell a mod to fix my perms'), user.mention))
+                self._dm_rules(cache, user, msg)
         else:
             if payload.event_type == "REACTION_ADD" and payload.user_id != self.bot.user.id:
                 await msg.clear_reactions()
 
-    async def _dm_rules(self, rules, user, msg):
-        react_rules = await rules.get_settings("react_rules")
-        rule_name = None
-        for rule in react_rules:
-            if rule["message"] == msg.id:
-                rule_name = rule["name"]
-
-        if rule_name is None:
+    def _dm_rules(self, cache, user, msg):
+        rule_name = cache.react_rules.get(msg.id)
+        rule = cache.rules.get(rule_name)
+        if rule is None or rule.get("alternate") is None:
             return
 
-        rule_text, date = await rules.get_rule_text(rule_name, alternate=True)
-        try:
-            embed = await self.helper._create_embed(rule_text, date)
-            await user.send(embed=embed)
-        except discord.Forbidden:
-            if msg.author.permissions_in(msg.channel):
-                await msg.channel.send("{} {}".format(_("I can't send you messages"), user.mention))
+        self.dm.submit(user, msg.channel, cache, rule_name, rule["alternate"], rule["edited"])
@@ -10,4 +10,5 @@ __red_end_user_data_statement__ = (
 
 async def setup(bot: Red):
     cog = TempChannel(bot)
+    await cog.initialize()
     await bot.add_cog(cog)
@@ -0,0 +1,43 @@
+import datetime
+import re
+import zoneinfo
+from typing import Optional
+
+WEEKDAYS = ["mon", "tue", "wed", "thu", "fri", "sat", "sun"]
+TIME_PATTERN = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+def parse_weekdays(human: str) -> Optional[list[int]]:
+    """
+    Parses weekdays like "mon,wed" or "mon-fri" into weekday numbers, monday being 0
+    """
+    days = set()
+    for part in human.lower().replace(" ", "").split(","):
+        start, _, end = part.partition("-")
+        if start[:3] not in WEEKDAYS or (end and end[:3] not in WEEKDAYS):
+            return None
+        first = WEEKDAYS.index(start[:3])
+        last = WEEKDAYS.index(end[:3]) if end else first
+        days.update(day % 7 for day in range(first, last + 1 if last >= first else last + 8))
+    return sorted(days)
+
+
+def format_weekdays(days: list[int]) -> str:
+    return ", ".join(WEEKDAYS[day].title() for day in days)
+
+
+def next_fire(recurring: dict, after: datetime.datetime) -> datetime.datetime:
+    """
+    Next time the recurring window opens after the given naive UTC time, as naive UTC
+    """
+    tz = zoneinfo.ZoneInfo(recurring["timezone"])
+    hour, minute = (int(part) for part in recurring["time"].split(":"))
+    local = after.replace(tzinfo=datetime.timezone.utc).astimezone(tz)
+    for days in range(8):
+        day = (local + datetime.timedelta(days=days)).date()
+        if day.weekday() not in recurring["weekdays"]:
+            continue
+        candidate = datetime.datetime.combine(day, datetime.time(hour, minute), tzinfo=tz)
+        if candidate > local:
+            return candidate.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+    return None
@@ -0,0 +1,149 @@
+import asyncio
+import datetime
+import heapq
+import itertools
+import logging
+from typing import Awaitable, Callable, Optional
+
+from .stats import TempStats
+
+
+class ScheduledClose:
+    """
+    A channel waiting for its deadline, to be closed or for a recurring window to open
+    """
+
+    __slots__ = ("guild_id", "channel_id", "until", "payload", "seq", "kind")
+
+    def __init__(self, guild_id: int, channel_id: int, until: datetime.datetime, payload: dict, seq: int,
+                 kind: str = "close"):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.until = until
+        self.payload = payload
+        self.seq = seq
+        self.kind = kind
+
+    @property
+    def key(self) -> tuple:
+        return (self.kind, self.channel_id)
+
+
+class CloseScheduler:
+    """
+    Runs channel closes, and recurring opens, at their deadline from one driver coroutine.
+
+    Deadlines are kept in a heap, with an index by kind and channel ID. A channel has at most one entry of each
+    kind. Cancelled and rescheduled entries are left in the heap and skipped when they reach the top, so every
+    operation is O(log n).
+    """
+
+    def __init__(self, callback: Callable[[ScheduledClose], Awaitable[None]], log: logging.Logger,
+                 stats: TempStats = None):
+        self.callback = callback
+        self.log = log
+        self.stats = stats or TempStats()
+        self._heap = []
+        self._channels = {}
+        self._guilds = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._driver: asyncio.Task = None
+        self._running = set()
+
+    def start(self) -> None:
+        if self._driver is None or self._driver.done():
+            self._driver = asyncio.create_task(self._run(), name="tempchannel-Scheduler")
+
+    def stop(self) -> None:
+        if self._driver:
+            self._driver.cancel()
+        for task in self._running:
+            task.cancel()
+
+    def schedule(self, guild_id: int, channel_id: int, until: datetime.datetime, payload: dict,
+                 kind: str = "close") -> ScheduledClose:
+        """
+        Schedules a deadline, replacing any deadline of the same kind already scheduled for the channel
+        """
+        self.cancel(channel_id, kind)
+        entry = ScheduledClose(guild_id, channel_id, until, payload, next(self._seq), kind)
+        self._channels[entry.key] = entry
+        self._guilds.setdefault(guild_id, set()).add(entry.key)
+        heapq.heappush(self._heap, (until, entry.seq, entry.key))
+        if self._heap[0][1] == entry.seq:
+            self._wakeup.set()
+        return entry
+
+    def reschedule(self, channel_id: int, until: datetime.datetime, kind: str = "close") -> Optional[ScheduledClose]:
+        entry = self._channels.get((kind, channel_id))
+        if entry is None:
+            return None
+        entry.payload["until"] = until.isoformat()
+        return self.schedule(entry.guild_id, channel_id, until, entry.payload, kind)
+
+    def cancel(self, channel_id: int, kind: str = "close") -> Optional[ScheduledClose]:
+        entry = self._channels.pop((kind, channel_id), None)
+        if entry is not None:
+            self._guilds[entry.guild_id].discard(entry.key)
+            if not self._guilds[entry.guild_id]:
+                del self._guilds[entry.guild_id]
+        return entry
+
+    def get(self, channel_id: int, kind: str = "close") -> Optional[ScheduledClose]:
+        return self._channels.get((kind, channel_id))
+
+    def guild(self, guild_id: int, kind: str = "close") -> list:
+        return [self._channels[key] for key in self._guilds.get(guild_id, ()) if key[0] == kind]
+
+    def entries(self) -> list:
+        return list(self._channels.values())
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def __len__(self) -> int:
+        return len(self._channels)
+
+    def _is_live(self, seq: int, key: tuple) -> bool:
+        entry = self._channels.get(key)
+        return entry is not None and entry.seq == seq
+
+    async def _run(self) -> None:
+        while True:
+            while self._heap and not self._is_live(self._heap[0][1], self._heap[0][2]):
+                heapq.heappop(self._heap)
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = (self._heap[0][0] - datetime.datetime.utcnow()).total_seconds()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            # Everything due is handed off at once, so one slow close does not hold up the rest
+            now = datetime.datetime.utcnow()
+            while self._heap and self._heap[0][0] <= now:
+                until, seq, key = heapq.heappop(self._heap)
+                if not self._is_live(seq, key):
+                    continue
+                entry = self.cancel(key[1], key[0])
+                task = asyncio.create_task(self._close(entry), name=f"tempchannel-{entry.kind}-{entry.channel_id}")
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+
+    async def _close(self, entry: ScheduledClose) -> None:
+        self.stats.observe_skew(entry.kind, (datetime.datetime.utcnow() - entry.until).total_seconds())
+        try:
+            await self.callback(entry)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.stats.events[f"{entry.kind}_failed"] += 1
+            self.log.exception("Running %s for channel %s failed", entry.kind, entry.channel_id)
@@ -0,0 +1,78 @@
+# Bot Packages
+import discord
+from redbot.core import Config
+
+GUILD_KEYS = ("create_forum_post", "temp_forum", "temp_role")
+CHANNEL_KEYS = ("create_forum_post", "last_title", "last_content")
+
+
+class TempSettings:
+    """
+    The guild and channel settings used to open and close one channel
+    """
+
+    __slots__ = ("guild", "channel")
+
+    def __init__(self, guild: dict, channel: dict):
+        self.guild = guild
+        self.channel = channel
+
+    @property
+    def temp_role(self) -> int:
+        return self.guild["temp_role"]
+
+    @property
+    def temp_forum(self) -> int:
+        return self.guild["temp_forum"]
+
+    @property
+    def do_forum(self) -> bool:
+        return self.channel["create_forum_post"] or self.guild["create_forum_post"]
+
+    @property
+    def last_title(self) -> str:
+        return self.channel["last_title"]
+
+    @property
+    def last_content(self) -> str:
+        return self.channel["last_content"]
+
+
+class SettingsCache:
+    """
+    Guild and channel settings, read with one `all()` each and kept until a tset command changes them
+    """
+
+    def __init__(self, config: Config):
+        self.config = config
+        self._guilds = {}
+        self._channels = {}
+
+    async def guild(self, guild: discord.Guild) -> dict:
+        data = self._guilds.get(guild.id)
+        if data is None:
+            stored = await self.config.guild(guild).all()
+            data = self._guilds[guild.id] = {key: stored[key] for key in GUILD_KEYS}
+        return data
+
+    async def get(self, channel: discord.TextChannel) -> TempSettings:
+        data = self._channels.get(channel.id)
+        if data is None:
+            stored = await self.config.channel(channel).all()
+            data = self._channels[channel.id] = {key: stored[key] for key in CHANNEL_KEYS}
+        return TempSettings(await self.guild(channel.guild), data)
+
+    async def set_last(self, channel: discord.TextChannel, title: str, content: str) -> None:
+        """
+        Stores the last forum post of the channel, so the next one can be numbered from it
+        """
+        await self.config.channel(channel).last_title.set(title)
+        await self.config.channel(channel).last_content.set(content)
+        if channel.id in self._channels:
+            self._channels[channel.id].update(last_title=title, last_content=content)
+
+    def invalidate(self, guild_id: int = None, channel_id: int = None) -> None:
+        if guild_id is not None:
+            self._guilds.pop(guild_id, None)
+        if channel_id is not None:
+            self._channels.pop(channel_id, None)
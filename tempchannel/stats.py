@@ -0,0 +1,77 @@
+import math
+from collections import Counter, deque
+
+# Upper bounds in seconds, the last bucket takes everything above
+BUCKETS = (0.1, 0.5, 1, 5, 30, 60, 300, math.inf)
+# Samples kept for the percentiles
+SAMPLES = 500
+
+
+class Histogram:
+    """
+    Bucketed counts since load, and the latest samples for percentiles
+    """
+
+    def __init__(self):
+        self.buckets = [0] * len(BUCKETS)
+        self.samples = deque(maxlen=SAMPLES)
+        self.count = 0
+        self.total = 0.0
+        self.max = None
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = value if self.max is None else max(self.max, value)
+        self.samples.append(value)
+        for index, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.buckets[index] += 1
+                break
+
+    def percentile(self, fraction: float) -> float:
+        if not self.samples:
+            return None
+        samples = sorted(self.samples)
+        return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+    def dump(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "p50": self.percentile(0.5),
+            "p99": self.percentile(0.99),
+            "max": self.max,
+            "buckets": {("+Inf" if math.isinf(bound) else str(bound)): count
+                        for bound, count in zip(BUCKETS, self.buckets)},
+        }
+
+
+class TempStats:
+    """
+    Counters for the scheduler and the close path, kept in memory until the cog is reloaded
+    """
+
+    def __init__(self):
+        self.skew = {}
+        self.forum_latency = Histogram()
+        self.events = Counter()
+
+    def observe_skew(self, kind: str, seconds: float) -> None:
+        """
+        How late a deadline was run, compared to when it was due
+        """
+        self.skew.setdefault(kind, Histogram()).observe(seconds)
+
+    def dump(self, scheduler) -> dict:
+        scheduled = {}
+        for entry in scheduler.entries():
+            byGuild = scheduled.setdefault(str(entry.guild_id), Counter())
+            byGuild[entry.kind] += 1
+        return {
+            "scheduled": {"total": len(scheduler), "guilds": {guild: dict(kinds) for guild, kinds in scheduled.items()},
+                          "running": scheduler.running},
+            "skew": {kind: histogram.dump() for kind, histogram in self.skew.items()},
+            "forum_latency": self.forum_latency.dump(),
+            "events": dict(self.events),
+        }
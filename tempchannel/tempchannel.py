@@ -5,9 +5,18 @@ from redbot.core.bot import Red
 
 import asyncio
 import datetime
+import io
+import json
 import logging
 import re
+import time
 import traceback
+import zoneinfo
+
+from .recurring import TIME_PATTERN, format_weekdays, next_fire, parse_weekdays
+from .scheduler import CloseScheduler, ScheduledClose
+from .settings import SettingsCache, TempSettings
+from .stats import TempStats
 
 TIMEDELTA_REGEX = (r'((?P<days>-?\d+)d)?'
                    r'((?P<hours>-?\d+)h)?'
@@ -17,6 +26,7 @@ TIMEDELTA_PATTERN = re.compile(TIMEDELTA_REGEX, re.IGNORECASE)
 
 DEFAULT_SETTINGS = {
     "create_forum_post": None,
+    "scheduled": {},
     "temp_dump": {},
     "temp_forum": 0,
     "temp_role": 0,
@@ -26,8 +36,18 @@ DEFAULT_SETTINGS_CHANNEL = {
     "create_forum_post": None,
     "last_title": "",
     "last_content": "",
+    "recurring": None,
 }
 
+# Channels changed at the same time by the bulk commands, overwrites are rate limited per channel
+BULK_CONCURRENCY = 5
+# A failed close is retried after RETRY_BASE seconds, doubling every attempt up to RETRY_MAX
+RETRY_BASE = 30
+RETRY_MAX = 1800
+# Failed forum post attempts before the post is given up on, and the channel is closed without it.
+# Closing the channel itself is retried for as long as Discord answers with a 429 or a 5xx
+RETRY_LIMIT = 6
+
 send_overwrite = discord.PermissionOverwrite()
 send_overwrite.send_messages = True
 send_overwrite.send_messages_in_threads = True
@@ -35,6 +55,12 @@ send_overwrite.view_channel = True
 send_overwrite.read_messages = True
 
 
+class ForumUnavailable(Exception):
+    """
+    The forum to post in is not in the cache, or not set up
+    """
+
+
 class TempChannel(commands.Cog):
     """
     Functions for the temporary channels
@@ -47,99 +73,316 @@ class TempChannel(commands.Cog):
         self.log.setLevel(logging.INFO)
         self.config.register_guild(**DEFAULT_SETTINGS)
         self.config.register_channel(**DEFAULT_SETTINGS_CHANNEL)
+        self._rehydrate_task: asyncio.Task = None
+        self.stats = TempStats()
+        self.scheduler = CloseScheduler(self._run_due, self.log, self.stats)
+        self.settings = SettingsCache(self.config)
+
+    async def initialize(self) -> None:
+        """
+        Picks up the closes scheduled before the last restart, once the bot is ready
+        """
+        self._rehydrate_task = asyncio.create_task(self._rehydrate(), name="tempchannel-Rehydrate")
 
     async def cog_unload(self) -> None:
-        for task in await self._get_all_my_tasks():
-            self.log.debug("Canceling task %s due to cog unload", task.get_name())
-            task.cancel()
+        if self._rehydrate_task:
+            self._rehydrate_task.cancel()
+        self.log.debug("Stopping scheduler with %s closes due to cog unload", len(self.scheduler))
+        self.scheduler.stop()
 
-    async def _get_all_my_tasks(self) -> set[asyncio.Task]:
+    async def _rehydrate(self) -> None:
         """
-        Get tasks created by this cog
+        Schedules the stored closes again, overdue ones are closed right away
         """
-        _ret = set()
-        for task in asyncio.all_tasks():
-            if task.get_name().startswith("tempchannel-"):
-                _ret.add(task)
-        return _ret
-
-    async def _get_all_guild_tasks(self, guild: discord.Guild) -> set[asyncio.Task]:
+        await self.bot.wait_until_red_ready()
+        for guildId, data in (await self.config.all_guilds()).items():
+            for channelId, entry in data.get("scheduled", {}).items():
+                if self.scheduler.get(int(channelId)):
+                    continue
+                until = datetime.datetime.fromisoformat(entry.get("retry_at") or entry["until"])
+                self.log.debug("Rehydrating close of %s at %s", channelId, until)
+                self.scheduler.schedule(guildId, int(channelId), until, entry)
+        now = datetime.datetime.utcnow()
+        for channelId, data in (await self.config.all_channels()).items():
+            channel = self.bot.get_channel(channelId)
+            if channel is None or not data.get("recurring"):
+                continue
+            self.scheduler.schedule(channel.guild.id, channelId, next_fire(data["recurring"], now),
+                                    data["recurring"], kind="open")
+        self.scheduler.start()
+
+    async def _run_due(self, entry: ScheduledClose) -> None:
         """
-        Get tasks created for this guild
+        Called by the scheduler when a deadline is reached
         """
-        _ret = set()
-        for task in await self._get_all_my_tasks():
-            cog, action, guildId, channelId = task.get_name().split("-")
-            if int(guildId) == guild.id:
-                _ret.add(task)
-        return _ret
+        if entry.kind == "open":
+            return await self._run_recurring(entry)
+        await self._run_close(entry)
 
-    async def _get_channel_task(self, channel: discord.TextChannel) -> asyncio.Task:
+    async def _run_recurring(self, entry: ScheduledClose) -> None:
         """
-        Get tasks created for the specified channel
+        Opens a recurring window, and schedules the next one
         """
-        for task in await self._get_all_my_tasks():
-            cog, action, guildId, channelId = task.get_name().split("-")
-            if int(channelId) == channel.id:
-                return task
-        return None
+        recurring = entry.payload
+        channel = self.bot.get_channel(entry.channel_id)
+        if channel is None:
+            return
+        self.scheduler.schedule(entry.guild_id, entry.channel_id, next_fire(recurring, entry.until), recurring,
+                                kind="open")
+
+        if self.scheduler.get(channel.id):
+            self.log.debug("%s is already open, skipping recurring window", channel.name)
+            return
+        settings = await self.settings.get(channel)
+        if not isinstance(channel.guild.get_role(settings.temp_role), discord.Role):
+            self.log.info("Skipping recurring window in %s, no role is set up", channel.name)
+            return
+        closingAt = entry.until + await self.parse_delta(recurring["duration"])
+        await self._start_windows(channel.guild, [channel], closingAt)
+
+    async def _run_close(self, entry: ScheduledClose) -> None:
+        """
+        Called by the scheduler when a channel is due to close
+        """
+        guild = self.bot.get_guild(entry.guild_id)
+        channel = guild.get_channel(entry.channel_id) if guild else None
+        if channel is None:
+            self.log.info("Dropping scheduled close for missing channel %s", entry.channel_id)
+            self.stats.events["close_missing"] += 1
+            await self.config.guild_from_id(entry.guild_id).scheduled.clear_raw(str(entry.channel_id))
+            return
+        closeMsg = channel.get_partial_message(entry.payload["message"])
+        try:
+            await self.closing_task(close_msg=closeMsg, forum_dict=entry.payload.get("forum"), entry=entry.payload,
+                                    settings=await self._entry_settings(channel, entry.payload))
+        except (discord.HTTPException, asyncio.TimeoutError, ForumUnavailable) as error:
+            await self._retry_close(entry, error)
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        if isinstance(error, discord.HTTPException):
+            return error.status == 429 or error.status >= 500
+        return True
+
+    async def _retry_close(self, entry: ScheduledClose, error: Exception) -> None:
+        """
+        Keeps a failed close stored, and schedules it again with backoff
 
-    async def _task_wait_until(self, until: datetime.datetime) -> None:
+        The forum post and the close itself are counted apart. The post is dropped once it keeps failing, a
+        channel left open is worse than a missing post. The close is retried at most every RETRY_MAX for as long as
+        the errors are ones that go away, and only given up on when they are not.
         """
-        Schedules a task to wait until the specified datetime
+        payload = entry.payload
+        retryable = self._retryable(error)
+        if payload.get("forum") and not payload.get("thread"):
+            # No thread yet, so it was the forum post that failed
+            attempt = payload.get("forum_attempt", 0) + 1
+            payload["forum_attempt"] = attempt
+            delay = min(RETRY_BASE * 2 ** (attempt - 1), RETRY_MAX)
+            if attempt >= RETRY_LIMIT or not retryable:
+                self.log.warning("Closing %s without a forum post after %s attempts: %s",
+                                 entry.channel_id, attempt, error)
+                self.stats.events["forum_dropped"] += 1
+                payload["forum"] = None
+                delay = 0
+        elif not retryable:
+            self.log.warning("Giving up on closing %s: %s", entry.channel_id, error)
+            self.stats.events["close_abandoned"] += 1
+            await self.config.guild_from_id(entry.guild_id).scheduled.clear_raw(str(entry.channel_id))
+            return
+        else:
+            attempt = payload.get("attempt", 0) + 1
+            payload["attempt"] = attempt
+            delay = min(RETRY_BASE * 2 ** (attempt - 1), RETRY_MAX)
+        self.log.info("Closing %s failed, retrying in %ss: %s", entry.channel_id, delay, error)
+
+        retryAt = datetime.datetime.utcnow() + datetime.timedelta(seconds=delay)
+        payload["retry_at"] = retryAt.isoformat()
+        self.stats.events["close_retried"] += 1
+        await self.config.guild_from_id(entry.guild_id).scheduled.set_raw(str(entry.channel_id), value=payload)
+        self.scheduler.schedule(entry.guild_id, entry.channel_id, retryAt, payload)
+        self.scheduler.start()
+
+    async def _entry_settings(self, channel: discord.TextChannel, entry: dict) -> TempSettings:
         """
-        now = datetime.datetime.utcnow()
-        seconds = (until - now).total_seconds()
-        await asyncio.sleep(seconds)
+        Settings to close with, the role and forum stored when the channel was opened win over the current ones
+        """
+        settings = await self.settings.get(channel)
+        if "role" not in entry:
+            return settings
+        return TempSettings({**settings.guild, "temp_role": entry["role"], "temp_forum": entry["forum_channel"]},
+                            settings.channel)
 
-    async def _close_channel(self, close_msg: discord.Message, thread: discord.Thread = False) -> None:
+    async def _close_channel(self, close_msg: discord.Message, settings: TempSettings, thread: int = None) -> None:
         """
-        Removes the overwritten permissions
+        Removes the overwritten permissions, safe to run again for a channel already closed
         """
-        role = await self.config.guild(close_msg.guild).temp_role()
-        target = close_msg.guild.get_role(role)
+        target = close_msg.guild.get_role(settings.temp_role)
 
         msgPrefix = ""
         if thread:
-            msgPrefix = f", and a thread has been opened {thread.thread.mention} "
+            msgPrefix = f", and a thread has been opened <#{thread}> "
 
         self.log.debug("Removing override for %s in %s", target.name, close_msg.channel.name)
         await close_msg.channel.set_permissions(target, overwrite=None)
-        await close_msg.edit(content=f"This channel is now closed{msgPrefix}")
-        await close_msg.unpin()
+        try:
+            await close_msg.edit(content=f"This channel is now closed{msgPrefix}")
+            await close_msg.unpin()
+        except discord.NotFound:
+            # The close message was deleted, the channel is closed all the same
+            pass
 
-    async def _open_channel(self, close_msg: discord.Message) -> None:
+    async def _open_channel(self, close_msg: discord.Message, settings: TempSettings) -> None:
         """
         Sets an overwrite to allow the role to send messages
         """
-        role = await self.config.guild(close_msg.guild).temp_role()
-        target = close_msg.guild.get_role(role)
+        target = close_msg.guild.get_role(settings.temp_role)
 
         self.log.debug("Overriding %s in %s", target.name, close_msg.channel.name)
         await close_msg.channel.set_permissions(target, overwrite=send_overwrite)
 
-    async def closing_task(self, until: datetime.datetime, close_msg: discord.Message, forum_dict: dict = None) -> None:
+    async def closing_task(self, close_msg: discord.Message, settings: TempSettings, forum_dict: dict = None,
+                           entry: dict = None) -> None:
         """
         Task to handle the closing of the channel
+
+        The ID of a created thread is stored in the entry right away, so a retried close does not post it twice
         """
-        thread = None
+        config = self.config.guild(close_msg.guild)
+        thread = entry.get("thread") if entry else None
         try:
-            self.log.debug("Starting open-loop in %s", close_msg.channel.name)
-            await self._open_channel(close_msg=close_msg)
-            await self._task_wait_until(until)
             self.log.debug("Done waiting in %s, closing", close_msg.channel.name)
-            if forum_dict:
-                if forum_dict.get("content"):
-                    forum_dict["content"] += f"\n\nChatter prior to closing: {close_msg.jump_url}"
+            if forum_dict and not thread:
+                post = dict(forum_dict)
+                if post.get("content"):
+                    post["content"] += f"\n\nChatter prior to closing: {close_msg.jump_url}"
                 self.log.debug("Creating thread in %s", close_msg.channel.name)
-                forumId = await self.config.guild(close_msg.guild).temp_forum()
-                forum = close_msg.guild.get_channel_or_thread(forumId)
-                thread = await forum.create_thread(**forum_dict)
-            await self._close_channel(close_msg=close_msg, thread=thread)
+                forum = close_msg.guild.get_channel_or_thread(settings.temp_forum)
+                if not isinstance(forum, discord.ForumChannel):
+                    self.stats.events["forum_failed"] += 1
+                    raise ForumUnavailable(f"Forum {settings.temp_forum} is not available")
+                started = time.monotonic()
+                try:
+                    created = await forum.create_thread(**post)
+                except discord.HTTPException:
+                    self.stats.events["forum_failed"] += 1
+                    raise
+                self.stats.forum_latency.observe(time.monotonic() - started)
+                self.stats.events["forum_created"] += 1
+                thread = created.thread.id
+                if entry is not None:
+                    entry["thread"] = thread
+                    await config.scheduled.set_raw(str(close_msg.channel.id), value=entry)
+            await self._close_channel(close_msg=close_msg, settings=settings, thread=thread)
+            await config.scheduled.clear_raw(str(close_msg.channel.id))
+            self.stats.events["closed"] += 1
 
         except asyncio.CancelledError:
+            # The close is still stored, and is picked up again on the next load
             self.log.debug("Task cancelled for %s", close_msg.channel.name)
-            await self._close_channel(close_msg=close_msg)
+
+    @staticmethod
+    def _bump_number(text: str) -> str:
+        """
+        Increments the trailing number of the text, "Office hours 4" becomes "Office hours 5"
+        """
+        if text:
+            m = re.search(r'\d+$', text)
+            if m is not None:
+                text = text.replace(m.group(), str(int(m.group()) + 1))
+        return text
+
+    async def _resolve_channels(self, guild: discord.Guild, channels: str = None,
+                                category: discord.CategoryChannel = None) -> list[discord.TextChannel]:
+        """
+        Resolves channel mentions or IDs, and the text channels of a category
+        """
+        _ret = {}
+        for channelId in re.findall(r'\d{15,20}', channels or ""):
+            channel = guild.get_channel(int(channelId))
+            if isinstance(channel, discord.TextChannel):
+                _ret[channel.id] = channel
+        if category:
+            for channel in category.text_channels:
+                _ret[channel.id] = channel
+        return list(_ret.values())
+
+    async def _gather_limited(self, coros) -> list:
+        """
+        Runs the coroutines concurrently, BULK_CONCURRENCY at a time
+        """
+        limit = asyncio.Semaphore(BULK_CONCURRENCY)
+
+        async def run(coro):
+            async with limit:
+                return await coro
+
+        return await asyncio.gather(*(run(coro) for coro in coros), return_exceptions=True)
+
+    async def _bulk_forum_dict(self, settings: TempSettings, channel: discord.TextChannel) -> dict:
+        """
+        Forum post for a channel opened in bulk, from the last post in the channel without asking
+        """
+        name = self._bump_number(settings.last_title)
+        content = self._bump_number(settings.last_content)
+        if not settings.do_forum or not name or not content:
+            return None
+        await self.settings.set_last(channel, name, content)
+        return {"name": name, "content": content}
+
+    @staticmethod
+    def _close_entry(closeMsg: discord.Message, closingAt: datetime.datetime, forumDict: dict,
+                     settings: TempSettings) -> dict:
+        """
+        The stored close of a channel, with the role and forum it was opened with
+        """
+        return {"message": closeMsg.id, "until": closingAt.isoformat(), "forum": forumDict,
+                "role": settings.temp_role, "forum_channel": settings.temp_forum}
+
+    async def _start_windows(self, guild: discord.Guild, channels: list,
+                             closingAt: datetime.datetime) -> dict:
+        """
+        Opens channels without asking, and schedules their close. Returns the opened channels with their entries
+
+        Like t_open, the closes are stored before any channel is opened, so a restart in between never leaves a
+        channel open without a stored close. Channels that then fail to open are rolled back.
+        """
+        async def announce(channel: discord.TextChannel) -> tuple:
+            settings = await self.settings.get(channel)
+            forumDict = await self._bulk_forum_dict(settings, channel)
+            closingTxt = discord.utils.format_dt(closingAt.replace(tzinfo=datetime.timezone.utc), style='t')
+            closeMsg = await channel.send(content=f"{channel.name} is now scheduled to close at {closingTxt}")
+            return closeMsg, settings, self._close_entry(closeMsg, closingAt, forumDict, settings)
+
+        results = await self._gather_limited(announce(channel) for channel in channels)
+        announced = {}
+        for channel, result in zip(channels, results):
+            if isinstance(result, Exception):
+                self.log.warning("Could not open %s: %s", channel.name, result)
+            else:
+                announced[channel] = result
+
+        config = self.config.guild(guild)
+        async with config.scheduled() as scheduled:
+            scheduled.update({str(channel.id): entry for channel, (_, _, entry) in announced.items()})
+
+        results = await self._gather_limited(self._open_channel(close_msg=closeMsg, settings=settings)
+                                             for closeMsg, settings, _ in announced.values())
+        failed = [channel for channel, error in zip(announced, results) if isinstance(error, Exception)]
+        if failed:
+            for channel, error in zip(announced, results):
+                if isinstance(error, Exception):
+                    self.log.warning("Could not open %s: %s", channel.name, error)
+            async with config.scheduled() as scheduled:
+                for channel in failed:
+                    scheduled.pop(str(channel.id), None)
+            await self._gather_limited(announced[channel][0].delete() for channel in failed)
+
+        opened = {channel: entry for channel, (_, _, entry) in announced.items() if channel not in failed}
+        for channel, entry in opened.items():
+            self.scheduler.schedule(guild.id, channel.id, closingAt, entry)
+        self.scheduler.start()
+        return opened
 
     async def parse_delta(self, human: str) -> str:  # gist.github.com/santiagobasulto/698f0ff660968200f873a2f9d1c4113c
         """ Parses a human readable timedelta (3d5h19m) into a datetime.timedelta.
@@ -190,6 +433,10 @@ class TempChannel(commands.Cog):
         if not isinstance(state, bool):
             return await ctx.send(f"{state} is not a boolean")
         await config.create_forum_post.set(state)
+        if channel:
+            self.settings.invalidate(channel_id=channel.id)
+        else:
+            self.settings.invalidate(guild_id=ctx.guild.id)
         await ctx.send(f"Forum post creation on channel close set to {state}{msgPostfix}")
 
     @_timed_set.command(name="forum")
@@ -201,6 +448,7 @@ class TempChannel(commands.Cog):
         if not isinstance(forum, discord.ForumChannel):
             return await ctx.send(f"{forum} is not a forum channel")
         await config.temp_forum.set(forum.id)
+        self.settings.invalidate(guild_id=ctx.guild.id)
         await ctx.send(f"Forum post creation set to {forum.mention}")
 
     @_timed_set.command(name="role")
@@ -212,8 +460,104 @@ class TempChannel(commands.Cog):
         if not isinstance(role, discord.Role):
             return await ctx.send(f"{role} is not a role")
         await config.temp_role.set(role.id)
+        self.settings.invalidate(guild_id=ctx.guild.id)
         await ctx.send(f"Changing {role.mention} on channel opening")
 
+    @_timed_set.command(name="stats")
+    async def _timed_set_stats(self, ctx: commands.Context, raw: bool = False) -> None:
+        """
+        Shows the scheduled channels, how late closes run and how forum posts fare
+
+        With raw, the numbers are sent as a JSON file instead
+        """
+        stats = self.stats.dump(self.scheduler)
+        if raw:
+            dump = io.BytesIO(json.dumps(stats, indent=2).encode())
+            return await ctx.send(file=discord.File(dump, filename="tempchannel-stats.json"))
+
+        def seconds(value: float) -> str:
+            return f"{value:.2f}s" if value is not None else "-"
+
+        guildKinds = stats["scheduled"]["guilds"].get(str(ctx.guild.id), {})
+        embed = discord.Embed(title="Temporary channels", colour=await ctx.embed_colour())
+        embed.add_field(name="Scheduled here", value=f"{guildKinds.get('close', 0)} closes, "
+                                                     f"{guildKinds.get('open', 0)} recurring opens")
+        embed.add_field(name="Scheduled total", value=f"{stats['scheduled']['total']}, "
+                                                      f"{stats['scheduled']['running']} running")
+        for kind, skew in stats["skew"].items():
+            late = f"p50 {seconds(skew['p50'])}, p99 {seconds(skew['p99'])}, max {seconds(skew['max'])}"
+            embed.add_field(name=f"Late {kind}s", value=f"{late} over {skew['count']}", inline=False)
+        forum = stats["forum_latency"]
+        embed.add_field(name="Forum posts", value=f"{stats['events'].get('forum_created', 0)} created, "
+                                                  f"{stats['events'].get('forum_failed', 0)} failed, "
+                                                  f"p50 {seconds(forum['p50'])}", inline=False)
+        failures = {key: count for key, count in stats["events"].items()
+                    if key.endswith(("_failed", "_missing", "_dropped", "_abandoned"))}
+        if failures:
+            embed.add_field(name="Failures", value=", ".join(f"{key}: {count}" for key, count in failures.items()),
+                            inline=False)
+        await ctx.send(embed=embed)
+
+    @_timed_set.group(name="recurring")
+    async def _timed_set_recurring(self, ctx: commands.Context) -> None:
+        """
+        Commands to manage channels opening on a weekly schedule
+        """
+
+    @_timed_set_recurring.command(name="set")
+    async def _timed_set_recurring_set(self, ctx: commands.Context, channel: discord.TextChannel, weekdays: str,
+                                       time: str, duration: str, timezone: str = "UTC") -> None:
+        """
+        Opens the channel every week, on the weekdays (mon,wed or mon-fri) at the time (18:00) for the duration
+
+        The time is in the given IANA timezone, like Europe/Oslo
+        """
+        days = parse_weekdays(weekdays)
+        if not days:
+            return await ctx.send(f"{weekdays} is not a list of weekdays, use mon,wed or mon-fri")
+        if not TIME_PATTERN.match(time):
+            return await ctx.send(f"{time} is not a time, use HH:MM")
+        if not await self.parse_delta(duration):
+            return await ctx.send("Invalid time format")
+        try:
+            zoneinfo.ZoneInfo(timezone)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            return await ctx.send(f"{timezone} is not a known timezone")
+
+        recurring = {"weekdays": days, "time": time, "duration": duration, "timezone": timezone}
+        await self.config.channel(channel).recurring.set(recurring)
+        nextOpen = next_fire(recurring, datetime.datetime.utcnow())
+        self.scheduler.schedule(ctx.guild.id, channel.id, nextOpen, recurring, kind="open")
+        self.scheduler.start()
+        nextOpen = discord.utils.format_dt(nextOpen.replace(tzinfo=datetime.timezone.utc))
+        await ctx.send(f"{channel.mention} opens every {format_weekdays(days)} at {time} ({timezone}) for "
+                       f"{duration}, next time is {nextOpen}")
+
+    @_timed_set_recurring.command(name="clear")
+    async def _timed_set_recurring_clear(self, ctx: commands.Context, channel: discord.TextChannel) -> None:
+        """
+        Stops the channel from opening on a schedule
+        """
+        await self.config.channel(channel).recurring.clear()
+        self.scheduler.cancel(channel.id, kind="open")
+        await ctx.send(f"{channel.mention} no longer opens on a schedule")
+
+    @_timed_set_recurring.command(name="list")
+    async def _timed_set_recurring_list(self, ctx: commands.Context) -> None:
+        """
+        Lists the channels opening on a schedule
+        """
+        entries = sorted(self.scheduler.guild(ctx.guild.id, kind="open"), key=lambda entry: entry.until)
+        if not entries:
+            return await ctx.send("No channels open on a schedule")
+        lines = []
+        for entry in entries:
+            recurring = entry.payload
+            nextOpen = discord.utils.format_dt(entry.until.replace(tzinfo=datetime.timezone.utc), style="R")
+            lines.append(f"<#{entry.channel_id}>: {format_weekdays(recurring['weekdays'])} at {recurring['time']} "
+                         f"({recurring['timezone']}) for {recurring['duration']}, next {nextOpen}")
+        await ctx.send("\n".join(lines))
+
     _timed = app_commands.Group(name="timed", description="Commands to manage temporary writeable channels")
 
     @app_commands.guild_only()
@@ -228,26 +572,17 @@ class TempChannel(commands.Cog):
 
         channel = channel or interaction.channel
 
-        if await self._get_channel_task(channel):
+        if self.scheduler.get(channel.id):
             return await interaction.response.send_message(f"{channel.name} is already scheduled to close")
 
-        config = self.config.guild(interaction.guild)
-        channelConfig = self.config.channel(channel)
+        settings = await self.settings.get(channel)
         notSetup = {"required": [], "optional": []}
-        _role = interaction.guild.get_role(await config.temp_role())
-        _forum = interaction.guild.get_channel(await config.temp_forum())
-        _lastTitle = await channelConfig.last_title()
-        _lastContent = await channelConfig.last_content()
-        if _lastTitle:
-            m = re.search(r'\d+$', _lastTitle)
-            if m is not None:
-                _lastTitle = _lastTitle.replace(m.group(), str(int(m.group()) + 1))
-        if _lastContent:
-            m = re.search(r'\d+$', _lastContent)
-            if m is not None:
-                _lastContent = _lastContent.replace(m.group(), str(int(m.group()) + 1))
+        _role = interaction.guild.get_role(settings.temp_role)
+        _forum = interaction.guild.get_channel(settings.temp_forum)
+        _lastTitle = self._bump_number(settings.last_title)
+        _lastContent = self._bump_number(settings.last_content)
 
-        _doForum = await channelConfig.create_forum_post() or await config.create_forum_post()
+        _doForum = settings.do_forum
 
         if not isinstance(_role, discord.Role):
             notSetup["required"].append("role")
@@ -274,7 +609,7 @@ class TempChannel(commands.Cog):
 
         _forumDict = view.view_data if _doForum or view.do_forum else None
 
-        if _forumDict.get("name") and _forumDict.get("content"):
+        if _forumDict and _forumDict.get("name") and _forumDict.get("content"):
             try:
                 len(_forumDict["name"]) <= 100
                 len(_forumDict["content"]) <= 1900
@@ -286,13 +621,112 @@ class TempChannel(commands.Cog):
             _forumDict = None
 
         if _forumDict:
-            await channelConfig.last_title.set(_forumDict.get("name"))
-            await channelConfig.last_content.set(_forumDict.get("content"))
-        self.bot.loop.create_task(self.closing_task(until=closingAt, close_msg=closeMsg, forum_dict=_forumDict),
-                                  name=f"tempchannel-CloseChannel-{closeMsg.guild.id}-{closeMsg.channel.id}")
+            await self.settings.set_last(channel, _forumDict.get("name"), _forumDict.get("content"))
+        entry = self._close_entry(closeMsg, closingAt, _forumDict, settings)
+        await self.config.guild(interaction.guild).scheduled.set_raw(str(channel.id), value=entry)
+        await self._open_channel(close_msg=closeMsg, settings=settings)
+        self.scheduler.schedule(interaction.guild.id, channel.id, closingAt, entry)
+        self.scheduler.start()
 
         return await interaction.edit_original_response(content="Channel scheduled to close", embed=None, view=None)
 
+    @app_commands.guild_only()
+    @app_commands.default_permissions(manage_messages=True)
+    @app_commands.describe(start_time="Relative time to hold the channels open(1d2h3m4s).",
+                           channels="Channels to open, as mentions or IDs",
+                           category="Open every text channel in this category")
+    @_timed.command(name="bulkopen")
+    async def t_bulk_open(self, interaction: discord.Interaction, start_time: str, channels: str = None,
+                          category: discord.CategoryChannel = None) -> None:
+        """
+        Command to temporarily open several channels, closing them at the same time
+        """
+        human = await self.parse_delta(start_time)
+        if not human:
+            return await interaction.response.send_message("Invalid time format", ephemeral=True)
+
+        guildSettings = await self.settings.guild(interaction.guild)
+        if not isinstance(interaction.guild.get_role(guildSettings["temp_role"]), discord.Role):
+            return await interaction.response.send_message("The following settings are not set up: role",
+                                                           ephemeral=True)
+
+        targets = [channel for channel in await self._resolve_channels(interaction.guild, channels, category)
+                   if not self.scheduler.get(channel.id)]
+        if not targets:
+            return await interaction.response.send_message("No channels to open", ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        closingAt = datetime.datetime.utcnow() + human
+
+        opened = await self._start_windows(interaction.guild, targets, closingAt)
+
+        failed = [channel.mention for channel in targets if channel not in opened]
+        closingTxt = discord.utils.format_dt(closingAt.replace(tzinfo=datetime.timezone.utc), style='R')
+        msg = f"Opened {len(opened)} channels, closing {closingTxt}"
+        if failed:
+            msg += f"\nCould not open {', '.join(failed)}"
+        await interaction.followup.send(msg, ephemeral=True)
+
+    @app_commands.guild_only()
+    @app_commands.default_permissions(manage_messages=True)
+    @app_commands.describe(channels="Channels to close, as mentions or IDs",
+                           category="Close every scheduled channel in this category")
+    @_timed.command(name="close")
+    async def t_close(self, interaction: discord.Interaction, channels: str = None,
+                      category: discord.CategoryChannel = None) -> None:
+        """
+        Command to close scheduled channels right away, the current channel if none are given
+        """
+        targets = await self._resolve_channels(interaction.guild, channels, category)
+        if not channels and not category:
+            targets = [interaction.channel]
+        entries = [entry for entry in (self.scheduler.cancel(channel.id) for channel in targets) if entry]
+        if not entries:
+            return await interaction.response.send_message("None of the channels are scheduled to close",
+                                                           ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+        await self._gather_limited(self._run_close(entry) for entry in entries)
+        await interaction.followup.send(f"Closed {len(entries)} channels", ephemeral=True)
+
+    @app_commands.guild_only()
+    @app_commands.default_permissions(manage_messages=True)
+    @app_commands.describe(extend_time="Relative time to add to the deadline(1d2h3m4s).",
+                           channels="Channels to extend, as mentions or IDs",
+                           category="Extend every scheduled channel in this category")
+    @_timed.command(name="extend")
+    async def t_extend(self, interaction: discord.Interaction, extend_time: str, channels: str = None,
+                       category: discord.CategoryChannel = None) -> None:
+        """
+        Command to push back the close of scheduled channels, the current channel if none are given
+        """
+        human = await self.parse_delta(extend_time)
+        if not human:
+            return await interaction.response.send_message("Invalid time format", ephemeral=True)
+        targets = await self._resolve_channels(interaction.guild, channels, category)
+        if not channels and not category:
+            targets = [interaction.channel]
+        entries = [self.scheduler.get(channel.id) for channel in targets if self.scheduler.get(channel.id)]
+        if not entries:
+            return await interaction.response.send_message("None of the channels are scheduled to close",
+                                                           ephemeral=True)
+        await interaction.response.defer(ephemeral=True, thinking=True)
+
+        entries = [self.scheduler.reschedule(entry.channel_id, entry.until + human) for entry in entries]
+        for entry in entries:
+            entry.payload.pop("retry_at", None)
+        async with self.config.guild(interaction.guild).scheduled() as scheduled:
+            for entry in entries:
+                scheduled[str(entry.channel_id)] = entry.payload
+
+        async def edit_one(entry):
+            channel = interaction.guild.get_channel(entry.channel_id)
+            closeMsg = channel.get_partial_message(entry.payload["message"])
+            closingTxt = discord.utils.format_dt(entry.until.replace(tzinfo=datetime.timezone.utc), style='t')
+            await closeMsg.edit(content=f"{channel.name} is now scheduled to close at {closingTxt}")
+
+        await self._gather_limited(edit_one(entry) for entry in entries)
+        await interaction.followup.send(f"Extended {len(entries)} channels by {extend_time}", ephemeral=True)
+
 
 class _SetForumButton(discord.ui.Button):
     def __init__(self, view_data: dict, forum) -> discord.ui.Button:
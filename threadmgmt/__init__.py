@@ -3,4 +3,5 @@ from threadmgmt.threadmgmt import ThreadManagement
 
 async def setup(bot):
     n = ThreadManagement(bot)
+    await n.initialize()
     await bot.add_cog(n)
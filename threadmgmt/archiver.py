@@ -0,0 +1,114 @@
+import discord
+
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+
+# Threads archived at the same time per guild, each archive is a send and an edit on the thread
+ARCHIVE_CONCURRENCY = 3
+# Seconds without new departures before the summary is posted, so a raid wave ends up in one summary
+SUMMARY_QUIET = 10
+# Threads listed by name in the summary
+SUMMARY_LIMIT = 20
+
+
+class ArchiveWorker:
+    """
+    Archives the threads of departed members for one guild, a few at a time
+    """
+
+    def __init__(self, guild: discord.Guild, summary_channel: Callable[[discord.Guild], Awaitable[Optional[
+            discord.TextChannel]]], log: logging.Logger):
+        self.guild = guild
+        self.summary_channel = summary_channel
+        self.log = log
+        self.pending = {}
+        self.archived = []
+        self.failed = []
+        self.members = set()
+        self.task: asyncio.Task = None
+        self._arrived = asyncio.Event()
+
+    def submit(self, user: discord.abc.User, threads: list):
+        """
+        Queues the threads of the member, a thread already queued is not archived twice
+        """
+        self.members.add(user.id)
+        for thread in threads:
+            self.pending.setdefault(thread.id, (thread, user))
+        self._arrived.set()
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run(), name=f"threadmgmt-Archiver-{self.guild.id}")
+
+    async def _run(self):
+        while True:
+            while self.pending:
+                batch = [self.pending.pop(threadId) for threadId in list(self.pending)[:ARCHIVE_CONCURRENCY]]
+                await asyncio.gather(*(self._archive(thread, user) for thread, user in batch))
+            self._arrived.clear()
+            try:
+                await asyncio.wait_for(self._arrived.wait(), timeout=SUMMARY_QUIET)
+                continue
+            except asyncio.TimeoutError:
+                pass
+            await self._report()
+            # submit() does not start a new task while this one runs, so threads queued during the report are
+            # picked up here. Their members were added after the report took its snapshot, and go in the next one
+            if not self.pending:
+                break
+
+    async def _archive(self, thread: discord.Thread, user: discord.abc.User):
+        try:
+            await thread.send(f"{user.mention} has left the server, this thread is now archived.")
+            await thread.edit(archived=True)
+            self.archived.append(thread)
+        except discord.HTTPException as error:
+            self.log.info("Could not archive %s in %s: %s", thread.id, self.guild.name, error)
+            self.failed.append(thread)
+
+    async def _report(self):
+        archived, self.archived = self.archived, []
+        failed, self.failed = self.failed, []
+        members, self.members = self.members, set()
+        if not archived and not failed:
+            return
+        channel = await self.summary_channel(self.guild)
+        if channel is None:
+            return self.log.info("Archived %s threads of %s departed members in %s",
+                                 len(archived), len(members), self.guild.name)
+
+        embed = discord.Embed(title="Threads archived", color=self.guild.me.color,
+                              description=f"Archived {len(archived)} threads of {len(members)} members who left")
+        if archived:
+            listed = "\n".join(thread.mention for thread in archived[:SUMMARY_LIMIT])
+            if len(archived) > SUMMARY_LIMIT:
+                listed += f"\nand {len(archived) - SUMMARY_LIMIT} more"
+            embed.add_field(name="Archived", value=listed, inline=False)
+        if failed:
+            embed.add_field(name="Failed", value="\n".join(thread.mention for thread in failed[:SUMMARY_LIMIT]),
+                            inline=False)
+        try:
+            await channel.send(embed=embed)
+        except discord.HTTPException as error:
+            self.log.info("Could not post the archive summary in %s: %s", self.guild.name, error)
+
+
+class ArchiveQueue:
+    """
+    Keeps an ArchiveWorker per guild
+    """
+
+    def __init__(self, summary_channel, log: logging.Logger):
+        self.summary_channel = summary_channel
+        self.log = log
+        self._guilds = {}
+
+    def guild(self, guild: discord.Guild) -> ArchiveWorker:
+        if guild.id not in self._guilds:
+            self._guilds[guild.id] = ArchiveWorker(guild, self.summary_channel, self.log)
+        return self._guilds[guild.id]
+
+    def cancel(self):
+        for worker in self._guilds.values():
+            if worker.task is not None:
+                worker.task.cancel()
@@ -0,0 +1,110 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Awaitable, Callable, Optional
+
+# Threads archived at the same time when several closes are due together
+CLOSE_CONCURRENCY = 5
+
+
+class PendingClose:
+    """
+    A thread tagged to be closed, waiting out its grace period
+    """
+
+    __slots__ = ("thread", "tag", "warn_msg", "due", "seq")
+
+    def __init__(self, thread, tag: str, warn_msg, due: float, seq: int):
+        self.thread = thread
+        self.tag = tag
+        self.warn_msg = warn_msg
+        self.due = due
+        self.seq = seq
+
+
+class ThreadCloser:
+    """
+    Runs the delayed closes of tagged threads from one driver task.
+
+    Pending closes are kept in a heap by their monotonic due time, with an index by thread ID so a close can be
+    cancelled as soon as the tag is removed. Cancelled closes are skipped when they reach the top of the heap.
+    """
+
+    def __init__(self, callback: Callable[[PendingClose], Awaitable[None]], log: logging.Logger):
+        self.callback = callback
+        self.log = log
+        self._heap = []
+        self._pending = {}
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._driver: asyncio.Task = None
+
+    def schedule(self, thread, tag: str, warn_msg, delay: float) -> PendingClose:
+        """
+        Closes the thread after the delay in seconds, replacing any close already pending for it
+        """
+        self.cancel(thread.id)
+        entry = PendingClose(thread, tag, warn_msg, time.monotonic() + delay, next(self._seq))
+        self._pending[thread.id] = entry
+        heapq.heappush(self._heap, (entry.due, entry.seq, thread.id))
+        if self._heap[0][1] == entry.seq:
+            self._wakeup.set()
+        if self._driver is None or self._driver.done():
+            self._driver = asyncio.create_task(self._run(), name="threadmgmt-Closer")
+        return entry
+
+    def cancel(self, thread_id: int) -> Optional[PendingClose]:
+        return self._pending.pop(thread_id, None)
+
+    def __contains__(self, thread_id: int) -> bool:
+        return thread_id in self._pending
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def stop(self):
+        if self._driver:
+            self._driver.cancel()
+
+    def _is_live(self, seq: int, thread_id: int) -> bool:
+        entry = self._pending.get(thread_id)
+        return entry is not None and entry.seq == seq
+
+    async def _run(self):
+        while True:
+            while self._heap and not self._is_live(self._heap[0][1], self._heap[0][2]):
+                heapq.heappop(self._heap)
+            self._wakeup.clear()
+            if not self._heap:
+                await self._wakeup.wait()
+                continue
+
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            batch = []
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                due, seq, threadId = heapq.heappop(self._heap)
+                if self._is_live(seq, threadId):
+                    batch.append(self._pending.pop(threadId))
+            await self._close_batch(batch)
+
+    async def _close_batch(self, batch: list):
+        limit = asyncio.Semaphore(CLOSE_CONCURRENCY)
+
+        async def close(entry: PendingClose):
+            async with limit:
+                try:
+                    await self.callback(entry)
+                except Exception:
+                    self.log.exception("Closing thread %s failed", entry.thread.id)
+
+        await asyncio.gather(*(close(entry) for entry in batch))
@@ -0,0 +1,107 @@
+import discord
+
+import asyncio
+import logging
+from typing import Callable, Optional
+
+# Seconds the tags of a thread have to stay unchanged before the notice is rendered
+NOTICE_DEBOUNCE = 3
+
+
+def hint_lookup(hints: dict) -> dict:
+    """
+    Tag name to (position, name, text), so rendering only has to look at the tags applied to the thread
+    """
+    return {tag: (index, hint["name"], hint["text"]) for index, (tag, hint) in enumerate(hints.items())}
+
+
+def render_notice(thread: discord.Thread, settings: dict) -> discord.Embed:
+    tagNotices = settings["tag_notices"]
+    lookup = settings["hint_lookup"]
+    embed = discord.Embed(title=tagNotices["title"], color=thread.guild.me.color,
+                          description=tagNotices["description"])
+    for _, name, text in sorted(lookup[tag.name] for tag in thread.applied_tags if tag.name in lookup):
+        embed.add_field(name=name, value=text)
+    return embed
+
+
+class _Notice:
+    __slots__ = ("thread", "timer", "message", "rendered")
+
+    def __init__(self, thread: discord.Thread):
+        self.thread = thread
+        self.timer: asyncio.TimerHandle = None
+        self.message: discord.Message = None
+        self.rendered: dict = None
+
+
+class TagNotices:
+    """
+    Posts the tag notice of a new thread once its tags have settled, and edits it when later tag changes alter it
+    """
+
+    def __init__(self, settings: Callable[[discord.ForumChannel], Optional[dict]], log: logging.Logger):
+        self.settings = settings
+        self.log = log
+        self._threads = {}
+        self._tasks = set()
+
+    def track(self, thread: discord.Thread):
+        """
+        Starts tracking a new thread, the notice is sent when its tags have been stable for NOTICE_DEBOUNCE
+        """
+        self._threads[thread.id] = _Notice(thread)
+        self.touch(thread)
+
+    def touch(self, thread: discord.Thread):
+        """
+        Restarts the debounce window of a tracked thread after its tags changed
+        """
+        notice = self._threads.get(thread.id)
+        if notice is None:
+            return
+        notice.thread = thread
+        if notice.timer is not None:
+            notice.timer.cancel()
+        notice.timer = asyncio.get_running_loop().call_later(NOTICE_DEBOUNCE, self._spawn, thread.id)
+
+    def forget(self, thread_id: int):
+        notice = self._threads.pop(thread_id, None)
+        if notice is not None and notice.timer is not None:
+            notice.timer.cancel()
+
+    def stop(self):
+        for thread_id in list(self._threads):
+            self.forget(thread_id)
+        for task in self._tasks:
+            task.cancel()
+
+    def _spawn(self, thread_id: int):
+        task = asyncio.create_task(self._flush(thread_id), name=f"threadmgmt-Notice-{thread_id}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, thread_id: int):
+        notice = self._threads.get(thread_id)
+        if notice is None:
+            return
+        notice.timer = None
+        thread = notice.thread
+        settings = self.settings(thread.parent)
+        if settings is None or not settings["tag_notices"]["is_enabled"]:
+            return self.forget(thread_id)
+
+        embed = render_notice(thread, settings)
+        rendered = embed.to_dict()
+        if rendered == notice.rendered:
+            return
+        try:
+            if notice.message is None:
+                notice.message = await thread.send(embed=embed)
+            else:
+                await notice.message.edit(embed=embed)
+            notice.rendered = rendered
+        except discord.NotFound:
+            self.forget(thread_id)
+        except discord.HTTPException as error:
+            self.log.info("Could not send the tag notice in %s: %s", thread.id, error)
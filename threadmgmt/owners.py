@@ -0,0 +1,65 @@
+import discord
+
+
+def is_active_forum_thread(thread: discord.Thread) -> bool:
+    return not thread.archived and not thread.locked and isinstance(thread.parent, discord.ForumChannel)
+
+
+class OwnerIndex:
+    """
+    Active forum threads by owner, kept up to date from the thread events.
+
+    A guild is indexed from `guild.threads` the first time it is looked at, after that only the events change it.
+    """
+
+    def __init__(self):
+        self._owners = {}
+        self._threads = {}
+        self._guilds = set()
+
+    def _index_guild(self, guild: discord.Guild):
+        if guild.id in self._guilds:
+            return
+        self._guilds.add(guild.id)
+        for thread in guild.threads:
+            self.update(thread)
+
+    def update(self, thread: discord.Thread):
+        """
+        Adds or removes the thread, based on if it is still an active forum thread
+        """
+        if thread.guild.id not in self._guilds:
+            return self._index_guild(thread.guild)
+        if is_active_forum_thread(thread):
+            self._threads[thread.id] = (thread.guild.id, thread.owner_id)
+            self._owners.setdefault((thread.guild.id, thread.owner_id), set()).add(thread.id)
+        else:
+            self.remove(thread.id)
+
+    def remove(self, thread_id: int):
+        key = self._threads.pop(thread_id, None)
+        if key is None:
+            return
+        threads = self._owners[key]
+        threads.discard(thread_id)
+        if not threads:
+            del self._owners[key]
+
+    def owned_by(self, guild: discord.Guild, owner_id: int) -> list:
+        """
+        The active forum threads of the member, re-checked against the thread cache
+        """
+        self._index_guild(guild)
+        threads = []
+        for threadId in list(self._owners.get((guild.id, owner_id), ())):
+            thread = guild.get_thread(threadId)
+            if thread is None or not is_active_forum_thread(thread):
+                self.remove(threadId)
+                continue
+            threads.append(thread)
+        return threads
+
+    def forget_guild(self, guild_id: int):
+        self._guilds.discard(guild_id)
+        for threadId in [threadId for threadId, key in self._threads.items() if key[0] == guild_id]:
+            self.remove(threadId)
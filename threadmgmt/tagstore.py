@@ -0,0 +1,145 @@
+import discord
+from redbot.core import Config
+from redbot.core.bot import Red
+
+import asyncio
+import logging
+from typing import Optional
+
+THREAD_SCOPE = "THREAD_MESSAGES"
+DEFAULT_SETTINGS_THREAD = {
+    "close": {},
+    "guild": None,
+    "invalid": None,
+}
+
+# Seconds between sweeps for warnings of threads that are gone
+SWEEP_INTERVAL = 3600
+# Threads checked before the sweeper yields to the event loop
+SWEEP_BATCH = 100
+
+
+class TagMessageStore:
+    """
+    Warning messages posted in threads, stored per thread instead of in one dict per forum. A pending close is
+    stored with its warning message and due time, so it survives a restart.
+
+    The IDs of threads with a stored warning are kept in memory, so archive and delete events only write when there
+    is something to clear. A sweeper drops the warnings of threads that were deleted or archived while the bot was
+    not watching.
+    """
+
+    def __init__(self, bot: Red, config: Config, log: logging.Logger):
+        self.bot = bot
+        self.config = config
+        self.log = log
+        self.config.init_custom(THREAD_SCOPE, 1)
+        self.config.register_custom(THREAD_SCOPE, **DEFAULT_SETTINGS_THREAD)
+        self._threads = set()
+        self._closes = {}
+        self._sweeper: asyncio.Task = None
+
+    async def initialize(self, forums: dict):
+        """
+        Moves the warnings still stored per forum into the thread scope, and starts the sweeper
+        """
+        for channelId, data in forums.items():
+            if not data.get("tag_messages"):
+                continue
+            for threadId, messages in data["tag_messages"].items():
+                if messages.get("invalid"):
+                    await self.config.custom(THREAD_SCOPE, threadId).set(
+                        {"guild": None, "invalid": messages["invalid"]})
+            await self.config.channel_from_id(channelId).tag_messages.clear()
+        stored = await self.config.custom(THREAD_SCOPE).all()
+        self._threads = {int(threadId) for threadId in stored}
+        self._closes = {int(threadId): data["close"] for threadId, data in stored.items() if data.get("close")}
+        self._sweeper = asyncio.create_task(self._sweep_loop(), name="threadmgmt-Sweeper")
+
+    def stop(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+    async def set_invalid(self, thread: discord.Thread, message_id: int):
+        await self._set(thread, "invalid", message_id)
+
+    async def pop_invalid(self, thread_id: int) -> Optional[int]:
+        """
+        Clears the warning of the thread, and returns its message ID
+        """
+        return await self._pop(thread_id, "invalid")
+
+    async def set_close(self, thread: discord.Thread, message_id: int, due: float):
+        """
+        Stores a pending close, due is a unix timestamp
+        """
+        await self._set(thread, "close", {"message": message_id, "due": due})
+
+    async def pop_close(self, thread_id: int) -> Optional[dict]:
+        self._closes.pop(thread_id, None)
+        return await self._pop(thread_id, "close")
+
+    def stored_closes(self) -> dict:
+        """
+        The pending closes loaded at cog load, by thread ID
+        """
+        closes, self._closes = self._closes, {}
+        return closes
+
+    async def _set(self, thread: discord.Thread, key: str, value):
+        scope = self.config.custom(THREAD_SCOPE, thread.id)
+        await scope.guild.set(thread.guild.id)
+        await scope.get_attr(key).set(value)
+        self._threads.add(thread.id)
+
+    async def _pop(self, thread_id: int, key: str):
+        if thread_id not in self._threads:
+            return None
+        scope = self.config.custom(THREAD_SCOPE, thread_id)
+        data = await scope.all()
+        if not any(data[other] for other in ("close", "invalid") if other != key):
+            await self.forget(thread_id)
+        else:
+            await scope.get_attr(key).clear()
+        return data[key]
+
+    async def forget(self, thread_id: int):
+        self._closes.pop(thread_id, None)
+        if thread_id not in self._threads:
+            return
+        self._threads.discard(thread_id)
+        await self.config.custom(THREAD_SCOPE, thread_id).clear()
+
+    async def _sweep_loop(self):
+        await self.bot.wait_until_red_ready()
+        while True:
+            try:
+                await self.sweep()
+            except Exception:
+                self.log.exception("Sweeping tag messages failed")
+            await asyncio.sleep(SWEEP_INTERVAL)
+
+    async def sweep(self) -> int:
+        """
+        Drops the warnings of threads that are no longer active, threads in unavailable guilds are left alone
+        """
+        threads = list(self._threads)
+        removed = 0
+        for start in range(0, len(threads), SWEEP_BATCH):
+            for threadId in threads[start:start + SWEEP_BATCH]:
+                thread = self.bot.get_channel(threadId)
+                if isinstance(thread, discord.Thread) and not thread.archived:
+                    continue
+                guildId = await self.config.custom(THREAD_SCOPE, threadId).guild()
+                guild = self.bot.get_guild(guildId) if guildId else None
+                if guild is not None and guild.unavailable:
+                    continue
+                await self.forget(threadId)
+                removed += 1
+            await asyncio.sleep(0)
+        if removed:
+            self.log.debug("Swept %s tag messages of inactive threads", removed)
+        return removed
@@ -1,20 +1,33 @@
 # Bot Packages
 import discord
-from redbot.core import Config, checks, commands
+from redbot.core import Config, checks, commands, modlog
 from redbot.core.bot import Red
 from redbot.core.utils import views
 
 import asyncio
 import logging
+import time
 from datetime import timedelta
-from typing import Literal, Union
+from typing import Literal, Optional, Union
+
+from .archiver import ArchiveQueue
+from .closer import PendingClose, ThreadCloser
+from .notices import TagNotices, hint_lookup
+from .owners import OwnerIndex
+from .tagstore import TagMessageStore
 
 TAG_TYPES = Literal["close", "invalid"]
 NOTICE_TYPES = Literal["description", "title"]
 
+DEFAULT_SETTINGS_GUILD = {
+    "mod_channel": None,
+}
+
 DEFAULT_SETTINGS_CHANNEL = {
     "close_tag": None,
+    "close_grace": 10,
     "invalid_tag": None,
+    # Moved to the thread scope of TagMessageStore, kept to migrate what is left
     "tag_messages": {},
     "tag_notices": {
         "is_enabled": False,
@@ -36,7 +49,89 @@ class ThreadManagement(commands.Cog):
             self, identifier=21346578436, force_registration=True)
         self.log = logging.getLogger("red.roxcogs.threadmgmt")
         self.log.setLevel(logging.INFO)
+        self.config.register_guild(**DEFAULT_SETTINGS_GUILD)
         self.config.register_channel(**DEFAULT_SETTINGS_CHANNEL)
+        self._forums = {}
+        self.closer = ThreadCloser(self._close_thread, self.log)
+        self.notices = TagNotices(self._forum_settings, self.log)
+        self.owners = OwnerIndex()
+        self.archiver = ArchiveQueue(self._summary_channel, self.log)
+        self.tag_messages = TagMessageStore(self.bot, self.config, self.log)
+        self._rehydrate_task: asyncio.Task = None
+
+    async def initialize(self):
+        """
+        Warms the settings cache with every configured forum, and loads the stored tag messages
+        """
+        forums = await self.config.all_channels()
+        for channelId, data in forums.items():
+            self._cache_forum(channelId, data)
+        await self.tag_messages.initialize(forums)
+        self._rehydrate_task = asyncio.create_task(self._rehydrate_closes(), name="threadmgmt-Rehydrate")
+
+    async def _rehydrate_closes(self):
+        """
+        Schedules the closes pending before the last restart again, once the threads are cached
+        """
+        await self.bot.wait_until_red_ready()
+        for threadId, close in self.tag_messages.stored_closes().items():
+            thread = self.bot.get_channel(threadId)
+            settings = self._forum_settings(thread.parent) if isinstance(thread, discord.Thread) else None
+            tag = settings["close_tag"] if settings else None
+            if thread is None or thread.archived or tag not in [x.name for x in thread.applied_tags]:
+                await self.tag_messages.pop_close(threadId)
+                continue
+            self.closer.schedule(thread, tag, thread.get_partial_message(close["message"]),
+                                 max(0, close["due"] - time.time()))
+
+    def _cache_forum(self, channel_id: int, data: dict):
+        """
+        Keeps the settings of a forum with anything configured, forums without are not stored at all
+        """
+        settings = {key: data[key] for key in ("close_tag", "close_grace", "invalid_tag")}
+        # all_channels() only fills in the top level defaults, a partly written tag_notices lacks the rest
+        settings["tag_notices"] = {**DEFAULT_SETTINGS_CHANNEL["tag_notices"], **data["tag_notices"]}
+        if settings["close_tag"] or settings["invalid_tag"] or settings["tag_notices"]["is_enabled"]:
+            settings["hint_lookup"] = hint_lookup(settings["tag_notices"]["hints"])
+            self._forums[channel_id] = settings
+        else:
+            self._forums.pop(channel_id, None)
+
+    async def _refresh_forum(self, channel: discord.ForumChannel):
+        """
+        Reloads the cached settings of the forum, after they have been changed
+        """
+        self._cache_forum(channel.id, await self.config.channel(channel).all())
+
+    async def cog_unload(self):
+        if self._rehydrate_task:
+            self._rehydrate_task.cancel()
+        self.closer.stop()
+        self.notices.stop()
+        self.archiver.cancel()
+        self.tag_messages.stop()
+
+    async def _summary_channel(self, guild: discord.Guild) -> Optional[discord.TextChannel]:
+        """
+        Channel for the archive summaries, the modlog channel unless one is set
+        """
+        channel = guild.get_channel(await self.config.guild(guild).mod_channel() or 0)
+        if channel is None:
+            try:
+                channel = await modlog.get_modlog_channel(guild)
+            except RuntimeError:
+                return None
+        if not channel.permissions_for(guild.me).send_messages:
+            return None
+        return channel
+
+    def _forum_settings(self, channel) -> Optional[dict]:
+        """
+        Cached settings of the forum, None if nothing is configured for it
+        """
+        if channel is None:
+            return None
+        return self._forums.get(channel.id)
 
     def _overwrite_view(self, ctx: commands.Context):
         """
@@ -75,6 +170,7 @@ class ThreadManagement(commands.Cog):
         config = self.config.channel(channel)
         state = not await config.tag_notices.is_enabled()
         await config.tag_notices.is_enabled.set(state)
+        await self._refresh_forum(channel)
         await ctx.send(f"Tag notices are now {'enabled' if state else 'disabled'} for {channel.mention}")
 
     @notice_set.command(name="hint")
@@ -111,6 +207,7 @@ class ThreadManagement(commands.Cog):
                 return
 
         await config.tag_notices.hints.set_raw(tag, value={"name": name, "text": text})
+        await self._refresh_forum(channel)
         embed = discord.Embed(title="New Tag Hint", description=f"This hint will be a part of a message posted in "
                               f"{channel.mention} when a thread is tagged with {tag}", color=ctx.guild.me.color)
         embed.add_field(name=name, value=text)
@@ -141,6 +238,7 @@ class ThreadManagement(commands.Cog):
                 return
         await ctx.send(f"{embed_type.title()} is now set to ```{text}``` for {channel.mention}")
         await self.config.channel(channel).set_raw("tag_notices", embed_type, value=text)
+        await self._refresh_forum(channel)
 
     @thread_set.command(name="tag")
     @checks.admin_or_permissions(manage_threads=True)
@@ -159,6 +257,7 @@ class ThreadManagement(commands.Cog):
                         f"{tag} is not a valid tag for {channel.mention}, valid tags are `{', '.join(validTags)}`"
                     )
             await self.config.channel(channel).set_raw(f"{tag_type}_tag", value=tag)
+            await self._refresh_forum(channel)
             await ctx.send(f"{tag_type.title()}-tag is now set to {tag} for {channel.mention}")
 
         if config is not None:
@@ -174,24 +273,66 @@ class ThreadManagement(commands.Cog):
         else:
             await write_tag(ctx, tag_type, channel, tag)
 
-    async def on_close_tag(self, message: discord.Thread, tag):
+    @thread_set.command(name="modchannel")
+    @checks.admin_or_permissions(manage_threads=True)
+    async def set_mod_channel(self, ctx: commands.Context, channel: discord.TextChannel = None):
+        """
+        Set the channel for summaries of threads archived when members leave, the modlog channel if none is set
+        """
+        await self.config.guild(ctx.guild).mod_channel.set(channel.id if channel else None)
+        if channel:
+            return await ctx.send(f"Archive summaries are now posted in {channel.mention}")
+        await ctx.send("Archive summaries are now posted in the modlog channel")
+
+    @thread_set.command(name="grace")
+    @checks.admin_or_permissions(manage_threads=True)
+    async def set_grace(self, ctx: commands.Context, channel: discord.ForumChannel, seconds: int):
+        """
+        Set how many seconds a thread tagged with the close-tag stays open for the mentioned ForumChannel
+        """
+        if not 0 <= seconds <= 86400:
+            return await ctx.send("Seconds must be between 0 and 86400")
+        await self.config.channel(channel).close_grace.set(seconds)
+        await self._refresh_forum(channel)
+        await ctx.send(f"Threads tagged to close in {channel.mention} are now closed after {seconds} seconds")
+
+    async def on_close_tag(self, message: discord.Thread, tag, seconds: int):
         """
         Acts on a thread being tagged as closed
         """
-        seconds = 10
         closingAt = discord.utils.utcnow() + timedelta(seconds=seconds)
         closingTxt = discord.utils.format_dt(closingAt, style="R")
         warnMsg = await message.send(
             f"The thread has been tagged as {tag}, and will be closed in {closingTxt} if tag is still present")
-        await asyncio.sleep(seconds - 1)
-        if tag in [x.name for x in message.parent.get_thread(message.id).applied_tags]:
-            await warnMsg.edit(content=f"The thread has been tagged as {tag}, and is closed")
-            await message.edit(archived=True, locked=True)
-        else:
-            await warnMsg.delete()
-        return
+        self.closer.schedule(message, tag, warnMsg, seconds)
+        # Stored as well, so a restart during a long grace period does not drop the close
+        await self.tag_messages.set_close(message, warnMsg.id, closingAt.timestamp())
+
+    async def off_close_tag(self, message: discord.Thread):
+        """
+        Cancels the pending close when the close-tag is removed
+        """
+        pending = self.closer.cancel(message.id)
+        stored = await self.tag_messages.pop_close(message.id)
+        warnMsg = pending.warn_msg if pending else message.get_partial_message(stored["message"]) if stored else None
+        if warnMsg:
+            try:
+                await warnMsg.delete()
+            except discord.NotFound:
+                pass
 
-    async def on_invalid_tag(self, config: Config, message: discord.Thread, tag):
+    async def _close_thread(self, pending: PendingClose):
+        """
+        Closes a thread once its grace period is over, if it is still tagged
+        """
+        await self.tag_messages.pop_close(pending.thread.id)
+        thread = pending.thread.parent.get_thread(pending.thread.id) if pending.thread.parent else None
+        if thread is None or pending.tag not in [x.name for x in thread.applied_tags]:
+            return await pending.warn_msg.delete()
+        await pending.warn_msg.edit(content=f"The thread has been tagged as {pending.tag}, and is closed")
+        await thread.edit(archived=True, locked=True)
+
+    async def on_invalid_tag(self, message: discord.Thread, tag):
         """
         Sends warning message to the thread when it is tagged as invalid
         """
@@ -199,16 +340,18 @@ class ThreadManagement(commands.Cog):
             f"The thread has been tagged as {tag} by a human, this likely happened because helpful "
             "information was missing from the post."
         )
-        await config.tag_messages.set_raw(message.id, value={"invalid": warnMsg.id})
+        await self.tag_messages.set_invalid(message, warnMsg.id)
 
-    async def off_invalid_tag(self, config: Config, message: discord.Thread):
+    async def off_invalid_tag(self, message: discord.Thread):
         """
         Removes the warning message from the thread when it is untagged as invalid
         """
-        warnMsg = await config.tag_messages.get_raw(message.id, "invalid")
+        warnMsg = await self.tag_messages.pop_invalid(message.id)
         if warnMsg:
-            await (await message.fetch_message(warnMsg)).delete()
-            await config.tag_messages.clear_raw(message.id, "invalid")
+            try:
+                await message.get_partial_message(warnMsg).delete()
+            except discord.NotFound:
+                pass
 
     @commands.Cog.listener()
     async def on_raw_member_remove(self, payload):
@@ -216,71 +359,79 @@ class ThreadManagement(commands.Cog):
         Listen on member removal to see if we need to do anything.
         """
         guild = self.bot.get_guild(payload.guild_id)
+        if guild is None:
+            return
         user = payload.user
-        userThreads = [x for x in guild.threads if
-                       x.owner_id == user.id
-                       and not x.archived
-                       and not x.locked
-                       and isinstance(x.parent, discord.ForumChannel)
-                       ]
-        for message in userThreads:
-            await message.send(f"{user.mention} has left the server, this thread is now archived.")
-            await message.edit(archived=True)
+        userThreads = self.owners.owned_by(guild, user.id)
+        if userThreads:
+            self.archiver.guild(guild).submit(user, userThreads)
+
+    @commands.Cog.listener()
+    async def on_raw_thread_delete(self, payload):
+        """
+        Forgets pending work for deleted threads
+        """
+        self.closer.cancel(payload.thread_id)
+        self.notices.forget(payload.thread_id)
+        self.owners.remove(payload.thread_id)
+        await self.tag_messages.forget(payload.thread_id)
+
+    @commands.Cog.listener()
+    async def on_thread_join(self, thread):
+        """
+        Threads unarchived while not cached are only seen when the bot joins them
+        """
+        self.owners.update(thread)
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild):
+        self.owners.forget_guild(guild.id)
 
     @commands.Cog.listener()
     async def on_thread_update(self, before, after):
         """
         Listen on thread updates to see if we need to do anything.
         """
+        self.owners.update(after)
         if isinstance(before.parent, discord.ForumChannel):
-            config = self.config.channel(before.parent)
-            closeTag = await config.close_tag()
-            invalidTag = await config.invalid_tag()
+            settings = self._forum_settings(before.parent)
+            if settings is None:
+                return
+            closeTag = settings["close_tag"]
+            invalidTag = settings["invalid_tag"]
 
             if after.archived:
-                return await config.tag_messages.clear_raw(before.id)
+                self.closer.cancel(before.id)
+                self.notices.forget(before.id)
+                return await self.tag_messages.forget(before.id)
 
             newTags = [
                 x.name for x in after.applied_tags if x not in before.applied_tags]
             oldTags = [
                 x.name for x in before.applied_tags if x not in after.applied_tags]
+            if newTags or oldTags:
+                self.notices.touch(after)
 
             if invalidTag in newTags:
-                await self.on_invalid_tag(config=config, message=before, tag=invalidTag)
+                await self.on_invalid_tag(message=before, tag=invalidTag)
             elif invalidTag in oldTags:
-                await self.off_invalid_tag(config=config, message=before)
+                await self.off_invalid_tag(message=before)
             if closeTag in newTags:
-                await self.on_close_tag(message=before, tag=closeTag)
+                await self.on_close_tag(message=before, tag=closeTag, seconds=settings["close_grace"])
+            elif closeTag in oldTags:
+                await self.off_close_tag(message=before)
             return
     ####
 
-    async def do_tag_notice(self, thread: discord.Thread, tag_notices: dict, description: str = None, title: str = None):
-        """
-        Sends a notice to the thread when it is tagged
-        """
-        seconds = 3
-        waitTxt = discord.utils.format_dt(
-            (discord.utils.utcnow() + timedelta(seconds=seconds)), style="R")
-        embed = discord.Embed(
-            title=title, color=thread.guild.me.color, description=description)
-        msg = await thread.send(f"This message will be updated in {waitTxt}, based on the tags applied to this thread",
-                                embed=embed)
-        await asyncio.sleep(seconds)
-        appliedTags = [x.name for x in thread.applied_tags]
-        for notice in tag_notices:
-            if notice in appliedTags:
-                embed.add_field(
-                    name=tag_notices[notice]["name"], value=tag_notices[notice]["text"])
-        await msg.edit(embed=embed, content=None)
-
     @commands.Cog.listener()
     async def on_thread_create(self, thread):
         """
         Listen on thread creation to see if we need to do anything.
         """
-        config = self.config.channel(thread.parent)
+        self.owners.update(thread)
+        settings = self._forum_settings(thread.parent)
+        if settings is None:
+            return
 
-        if await config.tag_notices.is_enabled():
-            await self.do_tag_notice(thread=thread, tag_notices=await config.tag_notices.hints(),
-                                     description=await config.tag_notices.description(),
-                                     title=await config.tag_notices.title())
+        if settings["tag_notices"]["is_enabled"]:
+            self.notices.track(thread)